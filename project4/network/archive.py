@@ -0,0 +1,108 @@
+"""
+Hot/cold split of the Post and Like tables.
+
+archive_batch() moves the oldest posts (timestamp older than
+NETWORK_ARCHIVE_AFTER_DAYS) into ArchivedPost, with their likes in
+ArchivedLike. Each batch is one transaction:
+- INSERT ... SELECT into the archive tables;
+- raw DELETEs of the post's likes, timeline entries and row, so no
+  counter signals fire.
+A run that stops part way has lost nothing, and the next run carries on
+from the oldest post still in the hot table.
+
+Posts keep their ids, and SQLite's AUTOINCREMENT never hands an id out
+twice, so like URLs and feed cursors stay valid after a move. Because
+posts leave in (timestamp, id) order, the archive always holds the
+oldest part of the feed. paginate() therefore reads it only once the
+hot rows run out (see its `fallback`).
+
+Archived posts stay on the newest-first feeds (/posts, profiles and
+/following) and can still be liked or unliked. They drop out of search,
+trending and /batch.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import feedcache
+from .models import Post, Like, TimelineEntry, ArchivedPost, ArchivedLike
+
+POST_COLUMNS = "id, user_id, content, timestamp, likes_count, hot_score"
+
+
+def archive_after():
+    return timedelta(days=getattr(settings, "NETWORK_ARCHIVE_AFTER_DAYS", 365))
+
+
+def cutoff(now=None):
+    return (now or timezone.now()) - archive_after()
+
+
+def pending(before):
+    """Hot posts older than `before`, oldest first, along post_feed_idx."""
+    return Post.objects.filter(timestamp__lt=before).order_by("timestamp", "id")
+
+
+def archive_batch(before, batch_size=500):
+    """Move up to `batch_size` of the oldest posts older than `before`; returns (posts, likes) moved."""
+    qn = connection.ops.quote_name
+    with transaction.atomic():
+        rows = list(pending(before).values_list("id", "user_id")[:batch_size])
+        if not rows:
+            return 0, 0
+        ids = [post_id for post_id, _ in rows]
+        marks = ", ".join(["%s"] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {qn(ArchivedPost._meta.db_table)} ({POST_COLUMNS}) "
+                f"SELECT {POST_COLUMNS} FROM {qn(Post._meta.db_table)} WHERE id IN ({marks})",
+                ids,
+            )
+            cursor.execute(
+                f"INSERT INTO {qn(ArchivedLike._meta.db_table)} (user_id, post_id) "
+                f"SELECT user_id, post_id FROM {qn(Like._meta.db_table)} WHERE post_id IN ({marks})",
+                ids,
+            )
+            likes = cursor.rowcount
+        # Children first; nothing here should touch counters or hot scores
+        for model, field in ((TimelineEntry, "post_id"), (Like, "post_id"), (Post, "id")):
+            queryset = model.objects.filter(**{f"{field}__in": ids})
+            queryset._raw_delete(queryset.db)
+        authors = {user_id for _, user_id in rows}
+        transaction.on_commit(lambda: feedcache.bump("feed", *(f"profile:{user_id}" for user_id in authors)))
+    return len(ids), likes
+
+
+def archive(before=None, batch_size=500, max_batches=None, progress=None):
+    """Archive batches until nothing older than `before` is left (or `max_batches`); returns totals."""
+    before = before or cutoff()
+    totals = {"posts": 0, "likes": 0, "batches": 0}
+    while max_batches is None or totals["batches"] < max_batches:
+        posts, likes = archive_batch(before, batch_size)
+        if not posts:
+            break
+        totals["posts"] += posts
+        totals["likes"] += likes
+        totals["batches"] += 1
+        if progress:
+            progress(totals)
+    return totals
+
+
+def toggle_like(user, post, liked):
+    """Like or unlike an ArchivedPost for `user`; returns its like count."""
+    with transaction.atomic():
+        if liked:
+            _, changed = ArchivedLike.objects.get_or_create(user=user, post=post)
+            delta = 1
+        else:
+            changed = ArchivedLike.objects.filter(user=user, post=post).delete()[0]
+            delta = -1
+        if changed:
+            ArchivedPost.objects.filter(pk=post.pk).update(likes_count=F("likes_count") + delta)
+            transaction.on_commit(lambda: feedcache.bump("feed", f"profile:{post.user_id}"))
+    post.refresh_from_db(fields=["likes_count"])
+    return post.likes_count
@@ -0,0 +1,70 @@
+"""
+Cached session and user lookups for authenticated requests.
+
+SESSION_ENGINE is cached_db: sessions are read from the cache and written
+through to the database, which remains the fallback on a miss.
+CachedAuthenticationMiddleware stands in for Django's
+AuthenticationMiddleware. It loads request.user from the same cache
+(SESSION_CACHE_ALIAS) for NETWORK_USER_CACHE_TIMEOUT seconds, so a warm
+request reaches the view without an auth query.
+
+A cached user is only used while the session's auth hash still matches
+it, as in django.contrib.auth.get_user. Saving or deleting a user and
+logging out drop the entry (network.signals), so a password change or an
+edit is seen on the next request. Columns written with QuerySet.update(),
+such as the follow counters, are not: they may lag on request.user until
+the entry expires, so read them from the database.
+
+Both are only invalidated in the cache that handled the change. With the
+default per-process LocMemCache, another worker keeps serving a logged-out
+session, or a user whose password has changed, until its own entry expires
+(up to SESSION_COOKIE_AGE for the session). That is fine for a single
+process; with several, point SESSION_CACHE_ALIAS at a cache they share,
+such as Memcached or Redis.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+
+def get_cache():
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+def cache_key(user_id):
+    return f"network:user:{user_id}"
+
+
+def user_timeout():
+    return getattr(settings, "NETWORK_USER_CACHE_TIMEOUT", 300)
+
+
+def get_user(request):
+    """django.contrib.auth.get_user, answered from the cache when the session still matches."""
+    session = request.session
+    user_id = session.get(auth.SESSION_KEY)
+    if user_id is None:
+        return AnonymousUser()
+    cached = get_cache().get(cache_key(user_id))
+    if (cached is not None and session.get(auth.BACKEND_SESSION_KEY) in settings.AUTHENTICATION_BACKENDS
+            and constant_time_compare(session.get(auth.HASH_SESSION_KEY, ""), cached.get_session_auth_hash())):
+        return cached
+    # Miss or mismatch: Django's own checks decide, flushing the session if needed
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        get_cache().set(cache_key(user.pk), user, user_timeout())
+    return user
+
+
+def forget_user(user_id):
+    get_cache().delete(cache_key(user_id))
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
@@ -0,0 +1,154 @@
+"""
+Several actions in one request, for clients that queue actions offline.
+
+POST /batch takes {"operations": [...]}, where each operation is one of
+    {"op": "like" | "unlike", "post": <id>}
+    {"op": "follow" | "unfollow", "user": <username>}
+    {"op": "edit", "post": <id>, "content": <text>}
+    {"op": "profile", "user": <username>}
+Operations are validated in order, and the last one per target wins.
+Everything is applied in one transaction. Likes go through the like
+buffer's grouped writer and edits through a single bulk UPDATE. Follows
+keep the per-row path, because their signals maintain timelines. An
+invalid operation fails alone. Profile summaries reflect the whole batch.
+Each write operation is charged to the rate limit of its endpoint's
+scope (see scopes()), so batching does not multiply the allowed rate.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from . import feedcache, likebuffer, stream
+from .models import User, Post, Follow
+
+
+class OperationError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# Rate limit scope charged for each operation; "profile" is a read
+SCOPES = {"like": "like", "unlike": "like", "follow": "follow", "unfollow": "follow", "edit": "edit"}
+
+
+def max_operations():
+    return getattr(settings, "NETWORK_BATCH_MAX_OPERATIONS", 100)
+
+
+def scopes(operations):
+    """{scope: number of operations} to charge for `operations`."""
+    counts = {}
+    for op in operations:
+        kind = op.get("op") if isinstance(op, dict) else None
+        scope = SCOPES.get(kind) if isinstance(kind, str) else None
+        if scope:
+            counts[scope] = counts.get(scope, 0) + 1
+    return counts
+
+
+def run_batch(viewer, operations):
+    """Apply `operations` for `viewer` and return one result dict per operation."""
+    if likebuffer.enabled():
+        # Clicks still in the buffer are older than this batch
+        likebuffer.get_buffer().flush()
+
+    ops = [op if isinstance(op, dict) else {} for op in operations]
+    # type() rather than isinstance(): JSON true/false must not pass as post 1/0
+    posts = Post.objects.in_bulk({op["post"] for op in ops if type(op.get("post")) is int})
+    users = {
+        user.username: user
+        for user in User.objects.filter(username__in={op["user"] for op in ops if type(op.get("user")) is str})
+    }
+    following = set(
+        Follow.objects.filter(follower=viewer, following__in=users.values()).values_list("following_id", flat=True)
+    )
+
+    def get_post(op):
+        if type(op.get("post")) is not int:
+            raise OperationError("'post' must be a post id.")
+        post = posts.get(op["post"])
+        if post is None:
+            raise OperationError("Post not found.", 404)
+        return post
+
+    def get_user(op):
+        if type(op.get("user")) is not str:
+            raise OperationError("'user' must be a username.")
+        user = users.get(op["user"])
+        if user is None:
+            raise OperationError("User not found.", 404)
+        return user
+
+    results = [None] * len(ops)
+    likes, edits, follows, done = {}, {}, {}, []
+    for i, op in enumerate(ops):
+        kind = op.get("op")
+        try:
+            if kind in ("like", "unlike"):
+                post = get_post(op)
+                likes[post.id] = kind == "like"
+                done.append((i, kind, post))
+            elif kind == "edit":
+                post = get_post(op)
+                if post.user_id != viewer.id:
+                    raise OperationError("You do not have permission to edit this post.", 403)
+                content = op.get("content")
+                if not isinstance(content, str) or not content:
+                    raise OperationError("Content cannot be empty.")
+                post.content = content
+                edits[post.id] = post
+                done.append((i, kind, post))
+            elif kind in ("follow", "unfollow"):
+                user = get_user(op)
+                if user.id == viewer.id:
+                    raise OperationError("You cannot follow yourself.")
+                follows[user.id] = kind == "follow"
+                done.append((i, kind, user))
+            elif kind == "profile":
+                done.append((i, kind, get_user(op)))
+            else:
+                raise OperationError(f"Unknown operation: {kind!r}.")
+        except OperationError as e:
+            results[i] = {"ok": False, "status": e.status, "error": str(e)}
+
+    with transaction.atomic():
+        likebuffer.write_likes({(viewer.id, post_id): liked for post_id, liked in likes.items()})
+
+        if edits:
+            Post.objects.bulk_update(edits.values(), ["content"])
+            feedcache.bump("feed", f"profile:{viewer.id}")
+            for post in edits.values():
+                transaction.on_commit(lambda post=post: stream.publish("edit", id=post.id, content=post.content))
+
+        for user_id, follow in follows.items():
+            if follow and user_id not in following:
+                Follow.objects.create(follower=viewer, following_id=user_id)
+                following.add(user_id)
+            elif not follow and user_id in following:
+                Follow.objects.filter(follower=viewer, following_id=user_id).delete()
+                following.discard(user_id)
+
+    like_counts = dict(Post.objects.filter(pk__in=likes).values_list("id", "likes_count")) if likes else {}
+    profile_ids = {target.id for _, kind, target in done if kind == "profile"}
+    summaries = {
+        row["id"]: row
+        for row in User.objects.filter(pk__in=profile_ids).values("id", "username", "followers_count", "following_count")
+    } if profile_ids else {}
+
+    for i, kind, target in done:
+        if kind in ("like", "unlike"):
+            results[i] = {"ok": True, "post": target.id, "liked": kind == "like", "like_count": like_counts[target.id]}
+        elif kind == "edit":
+            results[i] = {"ok": True, "post": target.id, "content": target.content}
+        elif kind in ("follow", "unfollow"):
+            results[i] = {"ok": True, "user": target.username, "following": target.id in following}
+        else:
+            summary = summaries[target.id]
+            results[i] = {
+                "ok": True,
+                "user": summary["username"],
+                "followers_count": summary["followers_count"],
+                "following_count": summary["following_count"],
+                "is_following": target.id in following,
+            }
+    return results
@@ -0,0 +1,288 @@
+"""
+Request benchmark for every route in network/urls.py.
+
+Each scenario is driven through the Django test client against the
+configured database (seed it with `seed_network` first), inside a
+transaction that is rolled back afterwards. Reports latency percentiles,
+queries per request and throughput, and compares against a saved baseline.
+
+run_concurrency measures read throughput on a feed while other threads
+write, to compare journal modes and the read-only alias of the production
+profile. Its writes are committed and undone by the writers themselves.
+
+run_payloads compares response bytes and encode time per feed page across
+?fields= variants and content codings, and page building from model
+instances against post_values() tuples.
+"""
+import json
+import threading
+import time
+
+from django.db import connections, transaction
+from django.db.models import F
+from django.http import JsonResponse as DjangoJsonResponse
+from django.test import Client, override_settings
+from django.urls import get_resolver
+
+from .hydration import feed_queryset, post_values, serialize_posts, serialize_values
+from .models import User, Post
+from .perf import Sample, percentile, wrap_connections
+from .responses import CODINGS, JsonResponse, compress
+
+# Routes that cannot be timed as a single request/response
+SKIPPED = {"stream": "long-lived event stream"}
+
+
+class Scenario:
+    __slots__ = ("name", "method", "path", "data", "content_type", "client", "setup")
+
+    def __init__(self, name, method, path, data=None, content_type=None, client=None, setup=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.content_type = content_type
+        self.client = client
+        self.setup = setup
+
+    def run(self, default_client, i):
+        client = self.client or default_client
+        if self.setup:
+            self.setup(client)
+        data = self.data(i) if callable(self.data) else self.data
+        kwargs = {"content_type": self.content_type} if self.content_type else {}
+        return getattr(client, self.method)(self.path, data, **kwargs)
+
+
+def build_scenarios(viewer, password):
+    """One or more scenarios per URL name, for a viewer who follows and is followed."""
+    author = User.objects.exclude(pk=viewer.pk).order_by(F("followers_count").desc()).first()
+    if author is None:
+        raise ValueError("Seed at least two users first.")
+    own_post = Post.objects.filter(user=viewer).first() or Post.objects.create(user=viewer, content="benchmark")
+    liked_post = Post.objects.order_by("-likes_count").first()
+    batch_posts = list(Post.objects.order_by("-timestamp").values_list("id", flat=True)[:8])
+    first_page = Client()
+    first_page.force_login(viewer)
+    next_cursor = first_page.get("/posts").json().get("next") or ""
+    hot_cursor = first_page.get("/posts", {"sort": "hot"}).json().get("next") or ""
+
+    anonymous = Client()
+    return [
+        Scenario("index", "get", "/"),
+        Scenario("login", "post", "/login", {"username": viewer.username, "password": password}, client=anonymous),
+        Scenario("logout", "get", "/logout", client=Client(), setup=lambda client: client.force_login(viewer)),
+        Scenario("register", "get", "/register", client=anonymous),
+        Scenario("posts", "get", "/posts"),
+        Scenario("posts:cursor", "get", "/posts", {"cursor": next_cursor}),
+        Scenario("posts:page", "get", "/posts", {"page": 2}),
+        Scenario("posts:hot", "get", "/posts", {"sort": "hot"}),
+        Scenario("posts:hot:cursor", "get", "/posts", {"sort": "hot", "cursor": hot_cursor}),
+        Scenario("posts:create", "post", "/posts", json.dumps({"content": "benchmark post"}), "application/json"),
+        Scenario("profile", "get", f"/profile/{author.username}"),
+        Scenario("user_page", "get", f"/users/{author.username}"),
+        Scenario("follow_user", "post", f"/follow/{author.username}"),
+        Scenario("like_post", "post", f"/like/{liked_post.id}",
+                 lambda i: json.dumps({"liked": i % 2 == 0}), "application/json"),
+        Scenario("edit_post", "post", f"/edit_post/{own_post.id}/", lambda i: {"content": f"edit {i}"}),
+        Scenario("following_posts", "get", "/following"),
+        Scenario("batch", "post", "/batch", lambda i: json.dumps({"operations": [
+            *({"op": "like" if i % 2 == 0 else "unlike", "post": post_id} for post_id in batch_posts),
+            {"op": "follow" if i % 2 == 0 else "unfollow", "user": author.username},
+            {"op": "edit", "post": own_post.id, "content": f"batch edit {i}"},
+            {"op": "profile", "user": author.username},
+        ]}), "application/json"),
+        Scenario("search", "get", "/search", {"q": "post 42"}),
+        Scenario("search:broad", "get", "/search", {"q": "post"}),
+        Scenario("search:author", "get", "/search", {"q": "post", "author": author.username}),
+        Scenario("suggestions", "get", "/suggestions"),
+        Scenario("cache_stats", "get", "/debug/cache"),
+        Scenario("perf_stats", "get", "/debug/perf"),
+    ]
+
+
+def run_benchmark(viewer, password="password", requests=50, warmup=5, only=None):
+    """Run every scenario and return {"scenarios": {...}, "skipped": {...}}."""
+    results, skipped = {}, dict(SKIPPED)
+    # One client hammers every endpoint; measure the views, not network.ratelimit
+    with override_settings(ALLOWED_HOSTS=["testserver"], NETWORK_RATE_LIMIT_ENABLED=False), transaction.atomic():
+        client = Client()
+        client.force_login(viewer)
+        scenarios = build_scenarios(viewer, password)
+        covered = {scenario.name.split(":")[0] for scenario in scenarios}
+        for name in get_resolver("network.urls").reverse_dict:
+            if isinstance(name, str) and name not in covered and name not in skipped:
+                skipped[name] = "no scenario"
+
+        for scenario in scenarios:
+            if only and scenario.name not in only:
+                continue
+            for i in range(warmup):
+                scenario.run(client, i)
+            latencies, queries, statuses = [], 0, set()
+            started = time.perf_counter()
+            for i in range(requests):
+                # Every alias, so reads routed to the replica are counted too
+                sample = Sample()
+                with wrap_connections(sample):
+                    t0 = time.perf_counter()
+                    response = scenario.run(client, warmup + i)
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                queries += sample.queries
+                statuses.add(response.status_code)
+            elapsed = time.perf_counter() - started
+            results[scenario.name] = {
+                "p50_ms": round(percentile(latencies, 50), 3),
+                "p95_ms": round(percentile(latencies, 95), 3),
+                "p99_ms": round(percentile(latencies, 99), 3),
+                "queries": round(queries / requests, 2),
+                "rps": round(requests / elapsed, 1),
+                "status": sorted(statuses),
+            }
+        transaction.set_rollback(True)
+    return {"scenarios": results, "skipped": skipped}
+
+
+def run_concurrency(viewer, readers=4, writers=2, duration=5.0, path="/posts"):
+    """
+    GET `path` from `readers` threads while `writers` threads create posts and
+    toggle likes on them for `duration` seconds. Every writer deletes what it
+    created. Returns throughput, read latency and failed requests per side.
+    """
+    stop = threading.Event()
+    lock = threading.Lock()
+    stats = {"read": [], "write": [], "read_errors": 0, "write_errors": 0}
+
+    def record(kind, started, ok):
+        with lock:
+            if ok:
+                stats[kind].append((time.perf_counter() - started) * 1000)
+            else:
+                stats[f"{kind}_errors"] += 1
+
+    def reader():
+        client = Client()
+        client.force_login(viewer)
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                ok = client.get(path).status_code == 200
+            except Exception:
+                ok = False
+            record("read", started, ok)
+
+    def writer():
+        client = Client()
+        client.force_login(viewer)
+        created = []
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                response = client.post("/posts", json.dumps({"content": "concurrency benchmark"}), "application/json")
+                ok = response.status_code == 201
+                if ok:
+                    post_id = response.json()["id"]
+                    created.append(post_id)
+                    for liked in (True, False):
+                        response = client.post(f"/like/{post_id}", json.dumps({"liked": liked}), "application/json")
+                        ok = ok and response.status_code == 200
+            except Exception:
+                ok = False
+            record("write", started, ok)
+        Post.objects.filter(id__in=created).delete()
+
+    def run(target):
+        try:
+            target()
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=run, args=(reader,)) for _ in range(readers)]
+    threads += [threading.Thread(target=run, args=(writer,)) for _ in range(writers)]
+    with override_settings(ALLOWED_HOSTS=["testserver"], NETWORK_RATE_LIMIT_ENABLED=False):
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    results = {}
+    for kind in ("read", "write"):
+        latencies = stats[kind]
+        results[kind] = {
+            "requests": len(latencies),
+            "errors": stats[f"{kind}_errors"],
+            "rps": round(len(latencies) / duration, 1),
+            "p50_ms": round(percentile(latencies, 50), 3) if latencies else None,
+            "p95_ms": round(percentile(latencies, 95), 3) if latencies else None,
+        }
+    return results
+
+
+def _timed(fn, repeat):
+    # Median milliseconds of `repeat` calls, and the last result
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return round(percentile(times, 50), 4), result
+
+
+def run_payloads(viewer, repeat=50):
+    """
+    {"pages": {variant: {encoding: {"bytes", "encode_ms"}}}, "rows": {...}}.
+
+    Each page's payload is fetched once, then re-encoded `repeat` times:
+    "django" is the stock JsonResponse, "identity" the compact one, and
+    gzip/deflate add compression on top. "rows" times fetching and
+    serializing one /posts page as model instances and as tuples.
+    """
+    author = User.objects.exclude(pk=viewer.pk).order_by(F("followers_count").desc()).first()
+    if author is None:
+        raise ValueError("Seed at least two users first.")
+    variants = [
+        ("posts", "/posts", {}),
+        ("posts:fields", "/posts", {"fields": "id,content,like_count"}),
+        ("following", "/following", {}),
+        ("following:fields", "/following", {"fields": "id,content,like_count"}),
+        ("profile", f"/profile/{author.username}", {}),
+        ("profile:fields", f"/profile/{author.username}", {"fields": "id,content,like_count"}),
+    ]
+    client = Client()
+    client.force_login(viewer)
+    pages = {}
+    with override_settings(ALLOWED_HOSTS=["testserver"]):
+        for name, path, params in variants:
+            payload = client.get(path, params).json()
+            results = {}
+            for encoding, encode in [
+                ("django", lambda: DjangoJsonResponse(payload).content),
+                ("identity", lambda: JsonResponse(payload).content),
+                *((coding, lambda coding=coding: compress(coding, JsonResponse(payload).content)) for coding in CODINGS),
+            ]:
+                ms, body = _timed(encode, repeat)
+                results[encoding] = {"bytes": len(body), "encode_ms": ms}
+            pages[name] = results
+
+    queryset = Post.objects.order_by("-timestamp", "-id")
+    rows = {
+        "instances_ms": _timed(lambda: serialize_posts(feed_queryset(queryset)[:10]), repeat)[0],
+        "tuples_ms": _timed(lambda: serialize_values(post_values(queryset)[:10]), repeat)[0],
+    }
+    return {"pages": pages, "rows": rows}
+
+
+def compare(current, baseline, tolerance=0.2):
+    """Regressions of `current` against `baseline`: slower p95 beyond `tolerance`, or more queries."""
+    regressions = []
+    for name, now in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        if now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {now['p95_ms']}ms")
+        if now["queries"] > before["queries"]:
+            regressions.append(f"{name}: queries {before['queries']} -> {now['queries']}")
+    return regressions
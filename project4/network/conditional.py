@@ -0,0 +1,46 @@
+"""
+Conditional GET for the JSON feeds.
+
+Validators come from the feedcache scope versions a page depends on, so
+they cost a few cache reads and no queries or serialization. A version is
+bumped by every write that can change the page, which makes the ETag
+strong. No Last-Modified is sent: versions have millisecond resolution
+but HTTP dates whole seconds, so If-Modified-Since could miss a write made
+in the same second as the cached response.
+"""
+import hashlib
+
+from django.views.decorators.http import condition
+
+from . import feedcache
+from .feedcache import PAGE_PARAMS
+
+
+def _versions(request, scopes, args, kwargs):
+    # Computed once per request
+    if not hasattr(request, "_feed_versions"):
+        names = scopes(request, *args, **kwargs)
+        if names is not None:
+            # Buffered like toggles change what this viewer sees before any flush
+            names = [*names, f"viewer:{request.user.id}"]
+        request._feed_versions = None if names is None else [feedcache.version(name) for name in names]
+    return request._feed_versions
+
+
+def feed_condition(scopes):
+    """
+    Answer If-None-Match with 304 before the view runs.
+
+    `scopes(request, *args, **kwargs)` names the feedcache scopes the page is
+    built from, or returns None to skip validation for this request.
+    """
+    def etag(request, *args, **kwargs):
+        versions = _versions(request, scopes, args, kwargs)
+        if versions is None or not request.user.is_authenticated:
+            return None
+        # ?fields= is applied after the page cache but still changes the body
+        params = "&".join(f"{name}={request.GET.get(name, '')}" for name in (*PAGE_PARAMS, "fields") if name in request.GET)
+        raw = f"{request.path}?{params}|{request.user.id}|{versions}"
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    return condition(etag_func=etag)
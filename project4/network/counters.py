@@ -0,0 +1,42 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .hot import rescored
+from .models import User, Post, Follow, Like, ArchivedPost, ArchivedLike
+
+
+def count_of(model, field):
+    # Correlated COUNT(*) of `model` rows pointing at the outer row through `field`
+    counts = model.objects.filter(**{field: OuterRef("pk")}).values(field).annotate(c=Count("*")).values("c")
+    return Coalesce(Subquery(counts), 0)
+
+
+COUNTERS = [
+    (Post, "likes_count", Like, "post"),
+    (ArchivedPost, "likes_count", ArchivedLike, "post"),
+    (User, "followers_count", Follow, "following"),
+    (User, "following_count", Follow, "follower"),
+]
+
+
+def repair_counters(dry_run=False):
+    """
+    Recompute every denormalized counter from the source tables.
+
+    Only drifted rows are rewritten, one UPDATE per counter. Returns
+    {"<Model>.<counter>": number of drifted rows}.
+    """
+    drift = {}
+    for model, counter, source, field in COUNTERS:
+        drifted = model.objects.annotate(actual=count_of(source, field)).exclude(**{counter: F("actual")})
+        key = f"{model.__name__}.{counter}"
+        if dry_run:
+            drift[key] = drifted.count()
+        else:
+            actual = count_of(source, field)
+            changes = {counter: actual}
+            if counter == "likes_count":
+                # The trending score moves with the like count
+                changes["hot_score"] = rescored(actual)
+            drift[key] = model.objects.filter(pk__in=drifted.values("pk")).update(**changes)
+    return drift
@@ -0,0 +1,91 @@
+"""
+Versioned cache for the viewer-independent part of feed and profile pages.
+
+Each cached page lives under a key containing the current version of its
+scope ("feed" for /posts, "profile:<user id>" for a profile). Writes bump
+the version instead of deleting keys, so stale pages are simply never read
+again and expire on their own. Versions are millisecond timestamps, which
+also gives every scope a last-modified time.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+PAGE_PARAMS = ("sort", "page", "cursor", "count")
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "bumps": 0}
+
+
+def get_cache():
+    return caches[getattr(settings, "NETWORK_CACHE_ALIAS", "default")]
+
+
+def page_timeout():
+    return getattr(settings, "NETWORK_CACHE_TIMEOUT", 300)
+
+
+def _record(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def version(scope):
+    cache = get_cache()
+    key = f"network:version:{scope}"
+    current = cache.get(key)
+    if current is None:
+        # Unknown scope (or a cold cache): anything cached before is unusable
+        cache.add(key, _now_ms(), None)
+        current = cache.get(key)
+    return current
+
+
+def bump(*scopes):
+    cache = get_cache()
+    for scope in scopes:
+        key = f"network:version:{scope}"
+        current = cache.get(key) or 0
+        cache.set(key, max(_now_ms(), current + 1), None)
+        _record("bumps")
+
+
+def page_key(scope, request):
+    params = "&".join(f"{name}={request.GET.get(name, '')}" for name in PAGE_PARAMS if name in request.GET)
+    digest = hashlib.md5(params.encode()).hexdigest()
+    return f"network:page:{scope}:{version(scope)}:{digest}"
+
+
+def cached_page(scope, request, build):
+    """Return the cached payload for this page of `scope`, calling `build()` on a miss."""
+    cache = get_cache()
+    key = page_key(scope, request)
+    payload = cache.get(key)
+    if payload is None:
+        _record("misses")
+        payload = build()
+        cache.set(key, payload, page_timeout())
+    else:
+        _record("hits")
+    return payload
+
+
+def stats():
+    with _stats_lock:
+        data = dict(_stats)
+    lookups = data["hits"] + data["misses"]
+    data["hit_rate"] = data["hits"] / lookups if lookups else 0.0
+    return data
+
+
+def reset_stats():
+    with _stats_lock:
+        for stat in _stats:
+            _stats[stat] = 0
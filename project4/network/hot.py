@@ -0,0 +1,31 @@
+"""
+Trending order for /posts?sort=hot.
+
+Post.hot_score = log10(max(likes, 1)) + (timestamp - HOT_EPOCH) / HOT_PERIOD,
+the Reddit "hot" formula. A tenfold jump in likes is worth 12.5 hours of
+recency, so engagement decays relative to newer posts without any row
+being rewritten as time passes. The score is set when a post is created.
+Every UPDATE of likes_count also shifts hot_score by the change in the log
+term (see `rescored`), so no query ever recomputes over the Like table.
+"""
+import math
+from datetime import datetime, timezone
+
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Log
+
+HOT_EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+HOT_PERIOD = 45000
+
+
+def hot_score(likes, timestamp):
+    return math.log10(max(likes, 1)) + (timestamp - HOT_EPOCH).total_seconds() / HOT_PERIOD
+
+
+def _log_likes(likes):
+    return Log(10, Greatest(likes, Value(1)))
+
+
+def rescored(likes):
+    """The hot_score assignment for an UPDATE that sets likes_count to `likes`."""
+    return F("hot_score") - _log_likes(F("likes_count")) + _log_likes(likes)
@@ -0,0 +1,113 @@
+from . import likebuffer
+from .models import Like, ArchivedLike
+
+
+def feed_queryset(queryset):
+    # The author rides along with the page query; like counts are denormalized
+    return queryset.select_related("user")
+
+
+def liked_post_ids(viewer, post_ids):
+    if not post_ids or not viewer.is_authenticated:
+        return set()
+    # Archived posts' likes ride along in the same query
+    liked = set(Like.objects.filter(user=viewer, post_id__in=post_ids).values_list("post_id", flat=True).union(
+        ArchivedLike.objects.filter(user=viewer, post_id__in=post_ids).values_list("post_id", flat=True)
+    ))
+    if likebuffer.enabled():
+        for post_id, is_liked in likebuffer.get_buffer().liked_overrides(viewer.id, post_ids).items():
+            (liked.add if is_liked else liked.discard)(post_id)
+    return liked
+
+
+# Post fields a client can pick with ?fields=; the last two are per viewer
+POST_FIELDS = ("id", "user", "content", "timestamp", "like_count")
+VIEWER_FIELDS = ("is_liked", "is_owner")
+
+
+def requested_fields(request, extra=()):
+    """
+    The names in `?fields=a,b`, or None (every field) when absent. `extra`
+    lists the view's own selectable fields. Raises ValueError on unknown names.
+    """
+    raw = request.GET.get("fields")
+    if not raw:
+        return None
+    names = tuple(dict.fromkeys(name.strip() for name in raw.split(",") if name.strip()))
+    unknown = set(names).difference(POST_FIELDS, VIEWER_FIELDS, extra)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}.")
+    return names
+
+
+def post_values(queryset, order_field="timestamp", relation=None):
+    """
+    `queryset` as named tuples of the serialized columns plus the sort key,
+    for paginate() and serialize_values(); no model instances are built.
+    `relation` is the foreign key to Post when `queryset` is over another
+    model, e.g. "post" for TimelineEntry (whose own timestamp is used).
+    """
+    prefix = f"{relation}__" if relation else ""
+    columns = [f"{relation}_id" if relation else "id", f"{prefix}user__username", f"{prefix}content",
+               "timestamp", f"{prefix}likes_count"]
+    if order_field not in columns:
+        columns.append(order_field)
+    return queryset.values_list(*columns, named=True)
+
+
+def serialize_values(rows):
+    # serialize_posts() for post_values() rows, read by position
+    return [{
+        'id': row[0],
+        'user': row[1],
+        'content': row[2],
+        'timestamp': row[3],
+        'like_count': row[4]
+    } for row in rows]
+
+
+def serialize_posts(posts):
+    # The viewer-independent part of each row, safe to share between viewers
+    return [{
+        'id': post.id,
+        'user': post.user.username,
+        'content': post.content,
+        'timestamp': post.timestamp,
+        'like_count': post.likes_count
+    } for post in posts]
+
+
+def overlay_viewer(rows, viewer, fields=None):
+    """
+    Add `viewer`'s is_liked/is_owner flags to serialized rows, in one query.
+    With `fields`, rows keep only the post fields among them and the query
+    is skipped unless is_liked is one.
+    """
+    if fields is None:
+        liked = liked_post_ids(viewer, [row['id'] for row in rows])
+        return [{
+            **row,
+            'is_liked': row['id'] in liked,
+            'is_owner': row['user'] == viewer.username
+        } for row in rows]
+
+    liked = liked_post_ids(viewer, [row['id'] for row in rows]) if 'is_liked' in fields else ()
+    flags = {
+        'is_liked': lambda row: row['id'] in liked,
+        'is_owner': lambda row: row['user'] == viewer.username,
+    }
+    names = [name for name in fields if name in POST_FIELDS or name in flags]
+    return [
+        {name: flags[name](row) if name in flags else row[name] for name in names}
+        for row in rows
+    ]
+
+
+def hydrate_posts(posts, viewer, fields=None):
+    """
+    Serialize a page of posts fetched through `feed_queryset` for `viewer`.
+
+    Costs one query for the viewer's likes on the page, however many
+    posts there are.
+    """
+    return overlay_viewer(serialize_posts(posts), viewer, fields)
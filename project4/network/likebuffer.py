@@ -0,0 +1,175 @@
+"""
+Write-coalescing buffer for like toggles.
+
+With NETWORK_LIKE_BUFFER on, like_post records toggles here instead of
+writing a Like row per click. Toggles are deduplicated per (user, post),
+last write wins, and flushed in one transaction with bulk_create and a
+single DELETE once NETWORK_LIKE_BUFFER_SIZE toggles are pending or
+NETWORK_LIKE_BUFFER_INTERVAL seconds have passed, and at shutdown. A
+flush that fails (e.g. "database is locked") puts its toggles back,
+behind any newer ones, and is retried after the interval.
+"""
+import atexit
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F
+
+from . import archive, feedcache, stream
+from .hot import rescored
+from .models import User, Post, Like, ArchivedPost
+
+
+def enabled():
+    return getattr(settings, "NETWORK_LIKE_BUFFER", False)
+
+
+def write_likes(changes):
+    """
+    Apply {(user_id, post_id): liked} with one bulk INSERT, one DELETE and one
+    counter UPDATE per distinct delta. Row signals are bypassed, so cache
+    versions and stream events are settled here. Toggles on posts deleted
+    since are dropped; archived ones go to the archive. Returns {post_id: delta}.
+    """
+    live = set(Post.objects.filter(pk__in={post_id for _, post_id in changes}).values_list("id", flat=True))
+    for (user_id, post_id), liked in changes.items():
+        if post_id not in live:
+            archived = ArchivedPost.objects.filter(pk=post_id).first()
+            if archived is not None:
+                archive.toggle_like(User(pk=user_id), archived, liked)
+    changes = {key: liked for key, liked in changes.items() if key[1] in live}
+    if not changes:
+        return {}
+    with transaction.atomic():
+        existing = dict(
+            ((user_id, post_id), like_id)
+            for like_id, user_id, post_id in Like.objects.filter(post_id__in={post_id for _, post_id in changes})
+            .filter(user_id__in={user_id for user_id, _ in changes})
+            .values_list("id", "user_id", "post_id")
+        )
+        to_create = [key for key, liked in changes.items() if liked and key not in existing]
+        to_delete = [key for key, liked in changes.items() if not liked and key in existing]
+
+        Like.objects.bulk_create(
+            [Like(user_id=user_id, post_id=post_id) for user_id, post_id in to_create],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        if to_delete:
+            Like.objects.filter(pk__in=[existing[key] for key in to_delete])._raw_delete(Like.objects.db)
+
+        deltas = defaultdict(int)
+        for _, post_id in to_create:
+            deltas[post_id] += 1
+        for _, post_id in to_delete:
+            deltas[post_id] -= 1
+        by_delta = defaultdict(list)
+        for post_id, delta in deltas.items():
+            if delta:
+                by_delta[delta].append(post_id)
+        for delta, ids in by_delta.items():
+            Post.objects.filter(pk__in=ids).update(
+                likes_count=F("likes_count") + delta, hot_score=rescored(F("likes_count") + delta)
+            )
+
+    if deltas:
+        author_ids = set(Post.objects.filter(pk__in=deltas).values_list("user_id", flat=True))
+        feedcache.bump("feed", *(f"profile:{author_id}" for author_id in author_ids))
+        transaction.on_commit(lambda: stream.publish_like_counts(list(deltas)))
+    return dict(deltas)
+
+
+class LikeBuffer:
+    def __init__(self, max_pending=500, interval=1.0):
+        self.max_pending = max_pending
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        # (user_id, post_id) -> [liked in the database when first buffered, liked now]
+        self.pending = {}
+        self.timer = None
+
+    def toggle(self, user_id, post_id, liked):
+        """Record a toggle and return the post's pending like-count delta."""
+        key = (user_id, post_id)
+        with self.lock:
+            entry = self.pending.get(key)
+        # Only the first toggle of a pair needs to ask the database; if the
+        # entry is flushed meanwhile, the database now holds its last state
+        base = entry[1] if entry is not None else Like.objects.filter(user_id=user_id, post_id=post_id).exists()
+        with self.lock:
+            self.pending.setdefault(key, [base, liked])[1] = liked
+            delta = self._delta(post_id)
+            full = len(self.pending) >= self.max_pending
+            if self.timer is None and not full:
+                self.timer = threading.Timer(self.interval, self._flush_from_timer)
+                self.timer.daemon = True
+                self.timer.start()
+        feedcache.bump(f"viewer:{user_id}")
+        if full:
+            try:
+                self.flush()
+            except DatabaseError:
+                pass  # The toggles stay pending and the timer retries them
+        return delta
+
+    def _delta(self, post_id):
+        return sum(int(now) - int(base) for (_, pid), (base, now) in self.pending.items() if pid == post_id)
+
+    def liked_overrides(self, user_id, post_ids):
+        # The viewer's own buffered state, so they always see their last click
+        with self.lock:
+            return {pid: self.pending[(user_id, pid)][1] for pid in post_ids if (user_id, pid) in self.pending}
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+    def flush(self):
+        """Write every pending toggle; returns the number of toggles applied."""
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, {}
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+            if not batch:
+                return 0
+
+            try:
+                write_likes({key: liked for key, (_, liked) in batch.items()})
+            except Exception:
+                self._restore(batch)
+                raise
+            return len(batch)
+
+    def _restore(self, batch):
+        # Put a failed batch back; toggles made since keep their newer state
+        with self.lock:
+            for key, (base, liked) in batch.items():
+                entry = self.pending.get(key)
+                self.pending[key] = [base, liked if entry is None else entry[1]]
+            if self.timer is None:
+                self.timer = threading.Timer(self.interval, self._flush_from_timer)
+                self.timer.daemon = True
+                self.timer.start()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = LikeBuffer(
+                max_pending=getattr(settings, "NETWORK_LIKE_BUFFER_SIZE", 500),
+                interval=getattr(settings, "NETWORK_LIKE_BUFFER_INTERVAL", 1.0),
+            )
+            atexit.register(_buffer.flush)
+        return _buffer
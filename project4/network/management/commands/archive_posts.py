@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from network.archive import archive, cutoff
+
+
+class Command(BaseCommand):
+    help = "Move posts older than NETWORK_ARCHIVE_AFTER_DAYS, with their likes, to the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Archive posts older than this many days instead.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Posts moved per transaction.")
+        parser.add_argument("--max-batches", type=int, help="Stop after this many batches; rerun to carry on.")
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options["days"]) if options["days"] is not None else cutoff()
+
+        def progress(totals):
+            self.stderr.write(f"batch {totals['batches']}: {totals['posts']} posts, {totals['likes']} likes")
+
+        totals = archive(before, options["batch_size"], options["max_batches"], progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {totals['posts']} posts and {totals['likes']} likes older than {before:%Y-%m-%d} "
+            f"in {totals['batches']} batches."
+        ))
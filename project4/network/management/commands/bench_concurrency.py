@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F
+
+from network.benchmark import run_concurrency
+from network.models import User
+from network.routers import read_alias
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure feed read throughput while other threads write. Run it once per "
+        "profile, e.g. with --journal-mode delete and then with NETWORK_PROFILE=production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument("--duration", type=float, default=5.0, help="Seconds to run.")
+        parser.add_argument("--path", default="/posts", help="Feed URL the readers request.")
+        parser.add_argument("--user", help="Username to browse as (default: the user following the most accounts).")
+        parser.add_argument("--journal-mode", choices=["delete", "wal"],
+                            help="Switch the database file to this journal mode first.")
+
+    def handle(self, *args, **options):
+        if options["user"]:
+            viewer = User.objects.filter(username=options["user"]).first()
+        else:
+            viewer = User.objects.order_by(F("following_count").desc()).first()
+        if viewer is None:
+            raise CommandError("No user to benchmark as; run seed_network first.")
+
+        with connection.cursor() as cursor:
+            if options["journal_mode"]:
+                cursor.execute(f"PRAGMA journal_mode = {options['journal_mode']}")
+            cursor.execute("PRAGMA journal_mode")
+            journal_mode = cursor.fetchone()[0]
+        connection.close()
+
+        self.stdout.write(
+            f"profile={getattr(settings, 'NETWORK_PROFILE', 'development')} journal_mode={journal_mode} "
+            f"read_alias={read_alias() or 'default'} readers={options['readers']} writers={options['writers']}"
+        )
+        results = run_concurrency(viewer, options["readers"], options["writers"], options["duration"], options["path"])
+
+        self.stdout.write(f"{'':<7}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}")
+        for kind, r in results.items():
+            p50 = f"{r['p50_ms']:>9.2f}" if r["p50_ms"] is not None else f"{'-':>9}"
+            p95 = f"{r['p95_ms']:>9.2f}" if r["p95_ms"] is not None else f"{'-':>9}"
+            self.stdout.write(f"{kind:<7}{r['requests']:>10}{r['errors']:>8}{r['rps']:>9.1f}{p50}{p95}")
@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from network.benchmark import compare, run_benchmark
+from network.models import User
+
+
+class Command(BaseCommand):
+    help = "Benchmark every network URL and optionally compare against a JSON baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50, help="Timed requests per scenario.")
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--user", help="Username to browse as (default: the user following the most accounts).")
+        parser.add_argument("--password", default="password", help="That user's password, for the login scenario.")
+        parser.add_argument("--only", nargs="*", help="Scenario names to run.")
+        parser.add_argument("--output", help="Write the results as a JSON baseline to this file.")
+        parser.add_argument("--baseline", help="Compare against this JSON baseline and fail on regressions.")
+        parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 slowdown (0.2 = 20%%).")
+
+    def handle(self, *args, **options):
+        if options["user"]:
+            viewer = User.objects.filter(username=options["user"]).first()
+        else:
+            viewer = User.objects.order_by(F("following_count").desc()).first()
+        if viewer is None:
+            raise CommandError("No user to benchmark as; run seed_network first.")
+
+        try:
+            results = run_benchmark(viewer, options["password"], options["requests"], options["warmup"], options["only"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"{'scenario':<18}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'req/s':>9}  status")
+        for name, r in results["scenarios"].items():
+            self.stdout.write(
+                f"{name:<18}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+                f"{r['queries']:>9.1f}{r['rps']:>9.1f}  {','.join(map(str, r['status']))}"
+            )
+        for name, reason in results["skipped"].items():
+            self.stdout.write(f"{name:<18}skipped: {reason}")
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Baseline written to {options['output']}")
+
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                regressions = compare(results, json.load(f), options["tolerance"])
+            if regressions:
+                raise CommandError("Regressions against baseline:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
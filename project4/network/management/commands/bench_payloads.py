@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from network.benchmark import run_payloads
+from network.models import User
+
+
+class Command(BaseCommand):
+    help = "Compare response bytes and encode time per feed page across ?fields= and content codings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=50, help="Timed encodes per page and coding.")
+        parser.add_argument("--user", help="Username to browse as (default: the user following the most accounts).")
+
+    def handle(self, *args, **options):
+        if options["user"]:
+            viewer = User.objects.filter(username=options["user"]).first()
+        else:
+            viewer = User.objects.order_by(F("following_count").desc()).first()
+        if viewer is None:
+            raise CommandError("No user to benchmark as; run seed_network first.")
+
+        try:
+            results = run_payloads(viewer, options["repeat"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"{'page':<18}{'encoding':<10}{'bytes':>8}{'encode ms':>11}")
+        for name, encodings in results["pages"].items():
+            for encoding, r in encodings.items():
+                self.stdout.write(f"{name:<18}{encoding:<10}{r['bytes']:>8}{r['encode_ms']:>11.3f}")
+        rows = results["rows"]
+        self.stdout.write(
+            f"/posts page from model instances {rows['instances_ms']:.3f} ms, from tuples {rows['tuples_ms']:.3f} ms"
+        )
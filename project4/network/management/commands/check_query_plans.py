@@ -0,0 +1,78 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from network.models import User, Post, Follow, Like, Suggestion
+
+# A table scan that is not walking an index, or a sort the index could not serve
+BAD_PLAN = re.compile(r"^SCAN (?!CONSTANT ROW)(?!.*\bUSING (COVERING )?INDEX\b)|USE TEMP B-TREE FOR ORDER BY")
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN QUERY PLAN every query the feed views run and fail on full scans or sorts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--show-plans", action="store_true", help="Print every plan, not just failures.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("check_query_plans only understands SQLite query plans.")
+
+        # Sample rows are created inside a transaction that is rolled back
+        with transaction.atomic():
+            queries = self.capture_view_queries()
+            failures = self.explain(queries, options["show_plans"])
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"{failures} queries fall back to a full scan or temp B-tree sort.")
+        self.stdout.write(self.style.SUCCESS(f"{len(queries)} queries use indexes."))
+
+    def capture_view_queries(self):
+        viewer = User.objects.create(username="__plan_viewer__")
+        author = User.objects.create(username="__plan_author__")
+        Follow.objects.create(follower=viewer, following=author)
+        posts = [Post.objects.create(user=author, content=f"plan {i}") for i in range(12)]
+        Like.objects.create(user=viewer, post=posts[0])
+
+        client = Client()
+        client.force_login(viewer)
+        queries = []
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            for url, base in (("/posts", {}), ("/posts", {"sort": "hot"}), ("/following", {}),
+                              (f"/profile/{author.username}", {})):
+                for params in ({}, {"page": 2}, "next"):
+                    if params == "next":
+                        params = {"cursor": client.get(url, base).json()["next"]}
+                    params = {**base, **params}
+                    with CaptureQueriesContext(connection) as ctx:
+                        client.get(url, params)
+                    queries += [(url, query["sql"]) for query in ctx.captured_queries]
+            # The popular-accounts fallback, then stored suggestions
+            for stored in (False, True):
+                if stored:
+                    candidate = User.objects.create(username="__plan_candidate__")
+                    Suggestion.objects.create(owner=viewer, candidate=candidate, mutuals=1, score=1.0)
+                with CaptureQueriesContext(connection) as ctx:
+                    client.get("/suggestions")
+                queries += [("/suggestions", query["sql"]) for query in ctx.captured_queries]
+        return [(url, sql) for url, sql in queries if sql.startswith("SELECT")]
+
+    def explain(self, queries, show_plans):
+        failures = 0
+        with connection.cursor() as cursor:
+            for url, sql in queries:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plan = [row[-1] for row in cursor.fetchall()]
+                bad = [step for step in plan if BAD_PLAN.search(step)]
+                if bad:
+                    failures += 1
+                if bad or show_plans:
+                    style = self.style.ERROR if bad else self.style.SQL_KEYWORD
+                    self.stdout.write(style(f"{url}: {sql}"))
+                    for step in plan:
+                        self.stdout.write(f"    {step}")
+        return failures
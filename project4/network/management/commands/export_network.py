@@ -0,0 +1,40 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from network.transfer import Exporter, export_records
+
+
+class Command(BaseCommand):
+    help = "Stream users, posts, follows and likes to an NDJSON file (gzipped when it ends in .gz)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="File to write, or - for standard output.")
+        parser.add_argument("--gzip", action="store_true", help="Compress even without a .gz suffix.")
+        parser.add_argument("--chunk-size", type=int, default=2000,
+                            help="Rows fetched per database round trip and written per checkpoint.")
+        parser.add_argument("--checkpoint", help="Progress file (default: <output>.progress).")
+        parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint of an interrupted run.")
+
+    def handle(self, *args, **options):
+        path = options["output"]
+        if path == "-":
+            if options["resume"]:
+                raise CommandError("An export to standard output cannot be resumed.")
+            written = export_records(sys.stdout.write, options["chunk_size"])
+            self.stderr.write(f"{written} records exported")
+            return
+
+        checkpoint = options["checkpoint"] or f"{path}.progress"
+        exporter = Exporter(path, checkpoint, compress=options["gzip"] or path.endswith(".gz"),
+                            chunk_size=options["chunk_size"], resume=options["resume"])
+        if exporter.offset:
+            self.stderr.write(f"Resuming after record {exporter.offset}")
+        try:
+            written = exporter.run()
+        except ValueError as e:
+            raise CommandError(f"{e} Delete {checkpoint} to start over.")
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stderr.write(f"{written} records exported ({exporter.offset} in total)")
@@ -0,0 +1,47 @@
+import gzip
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from network import feedcache
+from network.counters import repair_counters
+from network.suggestions import refresh as refresh_suggestions
+from network.timeline import rebuild_timelines
+from network.transfer import Importer
+
+
+class Command(BaseCommand):
+    help = "Load an export_network NDJSON file (plain or gzipped) in batches, remapping ids."
+
+    def add_arguments(self, parser):
+        parser.add_argument("input")
+        parser.add_argument("--batch-size", type=int, default=2000, help="Records per bulk INSERT and transaction.")
+        parser.add_argument("--checkpoint", help="Progress file (default: <input>.progress).")
+        parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint of an interrupted run.")
+
+    def handle(self, *args, **options):
+        path = options["input"]
+        checkpoint = options["checkpoint"] or f"{path}.progress"
+        importer = Importer(checkpoint, options["batch_size"], resume=options["resume"])
+        if importer.offset:
+            self.stdout.write(f"Resuming after record {importer.offset}")
+
+        with open(path, "rb") as f:
+            compressed = f.read(2) == b"\x1f\x8b"
+        try:
+            with (gzip.open if compressed else open)(path, "rt", encoding="utf-8") as f:
+                counts = importer.run(f)
+        except (ValueError, KeyError) as e:
+            raise CommandError(f"{e} Progress is saved in {checkpoint}; fix the input and rerun with --resume.")
+
+        # Derived data skipped by bulk_create: counters, hot scores, timelines, suggestions, cached pages
+        repair_counters()
+        entries = rebuild_timelines()
+        refresh_suggestions(full=True)
+        feedcache.bump("feed")
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {counts['user']} users, {counts['post']} posts, {counts['follow']} follows and "
+            f"{counts['like']} likes ({counts['skipped']} skipped); {entries} timeline entries rebuilt."
+        ))
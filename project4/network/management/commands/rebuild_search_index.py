@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from network.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text post search index, e.g. after a bulk import."
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The full-text index is SQLite-only; other databases search without one.")
+        self.stdout.write(f"{rebuild_index()} posts indexed")
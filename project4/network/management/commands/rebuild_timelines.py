@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from network.timeline import materialize_pulled, rebuild_timelines
+
+
+class Command(BaseCommand):
+    help = "Rebuild every materialized Following timeline from the Follow and Post tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pulled", action="store_true",
+                            help="Only fan out authors read on demand who are back under the threshold.")
+
+    def handle(self, *args, **options):
+        if options["pulled"]:
+            authors, entries = materialize_pulled()
+            self.stdout.write(f"{entries} timeline entries written for {authors} authors")
+            return
+        self.stdout.write(f"{rebuild_timelines()} timeline entries written")
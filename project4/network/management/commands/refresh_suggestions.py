@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from network.suggestions import refresh
+
+
+class Command(BaseCommand):
+    help = "Re-rank \"who to follow\" suggestions for users whose follow graph changed (or everyone)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Re-rank every user, not just stale ones.")
+
+    def handle(self, *args, **options):
+        result = refresh(full=options["full"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Ranked {result['users']} users over {result['edges']} follows in {result['chunks']} chunks "
+            f"({result['engine']}): {result['suggestions']} suggestions stored."
+        ))
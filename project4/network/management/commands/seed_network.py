@@ -0,0 +1,114 @@
+import random
+from bisect import bisect_left
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from network.counters import repair_counters
+from network.hot import hot_score
+from network.models import User, Post, Follow, Like
+from network.suggestions import refresh as refresh_suggestions
+from network.timeline import rebuild_timelines
+from network.transfer import explicit_timestamps
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic social graph: users, a power-law follow graph, posts and likes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--posts", type=int, default=10000, help="Total posts.")
+        parser.add_argument("--likes", type=int, default=50000, help="Total likes (before de-duplication).")
+        parser.add_argument("--follows", type=int, default=20, help="Average accounts followed per user.")
+        parser.add_argument("--alpha", type=float, default=1.1, help="Zipf exponent of author popularity.")
+        parser.add_argument("--days", type=int, default=365, help="Spread post timestamps over this many days.")
+        parser.add_argument("--password", default="password", help="Password for every seeded user.")
+        parser.add_argument("--prefix", default="user", help="Seeded usernames are <prefix><n>.")
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+
+        with transaction.atomic():
+            user_ids = self.create_users(options, batch_size)
+            # Popularity rank -> cumulative Zipf weight, shared by follows, posts and likes
+            ranked = user_ids[:]
+            rng.shuffle(ranked)
+            cum_weights = list(accumulate(1 / (rank + 1) ** options["alpha"] for rank in range(len(ranked))))
+
+            def popular():
+                return ranked[bisect_left(cum_weights, rng.random() * cum_weights[-1])]
+
+            self.create_follows(user_ids, popular, rng, options["follows"], batch_size)
+            post_ids = self.create_posts(popular, rng, options, batch_size)
+            self.create_likes(user_ids, post_ids, rng, options["likes"], batch_size)
+
+            repair_counters()
+            entries = rebuild_timelines()
+            refresh_suggestions(full=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(user_ids)} users, {len(post_ids)} posts and {entries} timeline entries."
+        ))
+
+    def create_users(self, options, batch_size):
+        password = make_password(options["password"])  # hashed once, shared by every user
+        prefix = options["prefix"]
+        start = User.objects.filter(username__startswith=prefix).count()
+        users = (User(username=f"{prefix}{n}", email=f"{prefix}{n}@example.com", password=password)
+                 for n in range(start, start + options["users"]))
+        self.bulk(User, users, batch_size)
+        return list(User.objects.filter(username__startswith=prefix).values_list("id", flat=True))
+
+    def create_follows(self, user_ids, popular, rng, average, batch_size):
+        def follows():
+            for follower_id in user_ids:
+                for _ in range(int(rng.expovariate(1 / average)) if average else 0):
+                    following_id = popular()
+                    if following_id != follower_id:
+                        yield Follow(follower_id=follower_id, following_id=following_id)
+        self.bulk(Follow, follows(), batch_size)
+
+    def create_posts(self, popular, rng, options, batch_size):
+        now = timezone.now()
+        span = options["days"] * 86400
+        def posts():
+            for n in range(options["posts"]):
+                timestamp = now - timedelta(seconds=rng.random() * span)
+                # bulk_create skips Post.save; repair_counters adds the likes later
+                yield Post(user_id=popular(), content=f"Seeded post {n}", timestamp=timestamp,
+                           hot_score=hot_score(0, timestamp))
+        first_id = (Post.objects.order_by("-id").values_list("id", flat=True).first() or 0) + 1
+        with explicit_timestamps():
+            self.bulk(Post, posts(), batch_size)
+        return list(Post.objects.filter(id__gte=first_id).values_list("id", flat=True))
+
+    def create_likes(self, user_ids, post_ids, rng, total, batch_size):
+        if not post_ids:
+            return
+        # Likes cluster on a few viral posts, like follows cluster on a few authors
+        cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(post_ids))))
+        likes = (Like(user_id=rng.choice(user_ids),
+                      post_id=post_ids[bisect_left(cum_weights, rng.random() * cum_weights[-1])])
+                 for _ in range(total))
+        self.bulk(Like, likes, batch_size)
+
+    def bulk(self, model, objs, batch_size):
+        # Stream a generator into bulk_create so memory stays at one batch
+        batch, written = [], 0
+        for obj in objs:
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+                written += len(batch)
+                batch = []
+                self.stdout.write(f"  {model.__name__}: {written}", ending="\r")
+        if batch:
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            written += len(batch)
+        self.stdout.write(f"  {model.__name__}: {written}")
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:41
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    counts = model.objects.filter(**{field: OuterRef("pk")}).values(field).annotate(c=Count("*")).values("c")
+    return Coalesce(Subquery(counts), 0)
+
+
+def populate_counters(apps, schema_editor):
+    User = apps.get_model("network", "User")
+    Post = apps.get_model("network", "Post")
+    Follow = apps.get_model("network", "Follow")
+    Like = apps.get_model("network", "Like")
+    Post.objects.update(likes_count=count_of(Like, "post"))
+    User.objects.update(
+        followers_count=count_of(Follow, "following"),
+        following_count=count_of(Follow, "follower"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0002_post_follow_like'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:47
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_post_timestamps(apps, schema_editor):
+    Post = apps.get_model("network", "Post")
+    TimelineEntry = apps.get_model("network", "TimelineEntry")
+    TimelineEntry.objects.update(
+        timestamp=Subquery(Post.objects.filter(pk=OuterRef("post_id")).values("timestamp")[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0004_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['following', 'follower'], name='follow_followers_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['post', 'user'], name='like_post_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-timestamp', '-id'], name='post_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='post_author_feed_idx'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_post_timestamps, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['owner', '-timestamp', '-post'], name='timeline_owner_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+from django.db import migrations
+
+# External-content FTS5 index over network_post.content. The triggers keep it
+# in step with inserts, content edits and deletes (including cascades).
+TABLE_SQL = """
+    CREATE VIRTUAL TABLE network_post_fts USING fts5(
+        content, content='network_post', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+
+# SQLite drops these whenever a migration rebuilds network_post, so such
+# migrations create them again
+TRIGGER_SQL = [
+    """
+    CREATE TRIGGER network_post_fts_insert AFTER INSERT ON network_post BEGIN
+        INSERT INTO network_post_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER network_post_fts_delete AFTER DELETE ON network_post BEGIN
+        INSERT INTO network_post_fts(network_post_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER network_post_fts_update AFTER UPDATE OF content ON network_post
+    WHEN old.content IS NOT new.content BEGIN
+        INSERT INTO network_post_fts(network_post_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO network_post_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+]
+
+CREATE_SQL = [TABLE_SQL, *TRIGGER_SQL, "INSERT INTO network_post_fts(network_post_fts) VALUES ('rebuild')"]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS network_post_fts_update",
+    "DROP TRIGGER IF EXISTS network_post_fts_delete",
+    "DROP TRIGGER IF EXISTS network_post_fts_insert",
+    "DROP TABLE IF EXISTS network_post_fts",
+]
+
+
+def run_on_sqlite(statements):
+    # FTS5 is SQLite-only; other databases use the icontains fallback in network.search
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == "sqlite":
+            for sql in statements:
+                schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0005_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(CREATE_SQL), run_on_sqlite(DROP_SQL)),
+    ]
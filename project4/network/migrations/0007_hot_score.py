@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:07
+
+import math
+from datetime import datetime, timezone
+from importlib import import_module
+
+from django.db import migrations, models
+
+search_migration = import_module("network.migrations.0006_post_search")
+
+HOT_EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+HOT_PERIOD = 45000
+
+
+def score_posts(apps, schema_editor):
+    Post = apps.get_model("network", "Post")
+    batch = []
+    for post in Post.objects.only("id", "likes_count", "timestamp").iterator(chunk_size=2000):
+        post.hot_score = math.log10(max(post.likes_count, 1)) + (post.timestamp - HOT_EPOCH).total_seconds() / HOT_PERIOD
+        batch.append(post)
+        if len(batch) >= 2000:
+            Post.objects.bulk_update(batch, ["hot_score"])
+            batch = []
+    Post.objects.bulk_update(batch, ["hot_score"])
+
+
+def restore_search_triggers(apps, schema_editor):
+    # Adding or removing the column rebuilds network_post, which drops its triggers
+    if schema_editor.connection.vendor == "sqlite":
+        for sql in [*search_migration.DROP_SQL[:3], *search_migration.TRIGGER_SQL]:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0006_post_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(score_posts, migrations.RunPython.noop),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-hot_score', '-id'], name='post_hot_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0008_suggestions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPost',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('content', models.TextField(max_length=500)),
+                ('timestamp', models.DateTimeField()),
+                ('likes_count', models.PositiveIntegerField(default=0)),
+                ('hot_score', models.FloatField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_posts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedLike',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_likes', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='likes', to='network.archivedpost')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedpost',
+            index=models.Index(fields=['-timestamp', '-id'], name='archived_post_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedpost',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='archived_post_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedlike',
+            index=models.Index(fields=['post', 'user'], name='archived_like_post_user_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='archivedlike',
+            unique_together={('user', 'post')},
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pulled_authors(apps, schema_editor):
+    # Authors over the threshold were never fanned out; keep reading their posts on demand
+    User = apps.get_model("network", "User")
+    threshold = getattr(settings, "NETWORK_FANOUT_THRESHOLD", 1000)
+    User.objects.filter(followers_count__gte=threshold).update(timeline_pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0009_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='timeline_pulled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_pulled_authors, migrations.RunPython.noop),
+    ]
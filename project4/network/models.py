@@ -1,20 +1,54 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
+
+from .hot import hot_score
 
 class User(AbstractUser):
     # following = models.ManyToManyField('self', symmetrical=False, related_name='followers', blank=True)
-    pass
+    # Denormalized Follow counts, kept in step by network.signals
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # Set when the user's follows change; cleared by network.suggestions
+    suggestions_stale = models.BooleanField(default=False)
+    # Posts are read on demand instead of fanned out, until network.timeline materializes them
+    timeline_pulled = models.BooleanField(default=False)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Most-followed accounts, the suggestions fallback for new users
+            models.Index(fields=["-followers_count", "id"], name="user_popular_idx"),
+        ]
 
 class Post(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="posts")
     content = models.TextField(max_length=500)
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Denormalized Like count, kept in step by network.signals
+    likes_count = models.PositiveIntegerField(default=0)
+    # Trending rank, set on creation and moved with likes_count (see network.hot)
+    hot_score = models.FloatField(default=0)
 
     def __str__(self):
         return f"Post {self.id} by {self.user.username}"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.hot_score = hot_score(self.likes_count, self.timestamp or timezone.now())
+        super().save(*args, **kwargs)
+
     def like_count(self):
-        return self.likes.count()
+        return self.likes_count
+
+    class Meta:
+        indexes = [
+            # Global feed and keyset cursors: ORDER BY timestamp DESC, id DESC
+            models.Index(fields=["-timestamp", "-id"], name="post_feed_idx"),
+            # Profile feed: WHERE user_id = ? ORDER BY timestamp DESC, id DESC
+            models.Index(fields=["user", "-timestamp", "-id"], name="post_author_feed_idx"),
+            # Trending feed: ORDER BY hot_score DESC, id DESC
+            models.Index(fields=["-hot_score", "-id"], name="post_hot_idx"),
+        ]
 
 class Follow(models.Model):
     follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name="following")
@@ -25,6 +59,10 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ("follower", "following")
+        indexes = [
+            # Followers of an author (fan-out, counters) without touching the table
+            models.Index(fields=["following", "follower"], name="follow_followers_idx"),
+        ]
 
 class Like(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="likes")
@@ -34,4 +72,70 @@ class Like(models.Model):
         return f"{self.user.username} likes Post {self.post.id}"
 
     class Meta:
-        unique_together = ("user", "post")
\ No newline at end of file
+        unique_together = ("user", "post")
+        indexes = [
+            # Likes on a post by user; (user, post) is covered by the unique constraint
+            models.Index(fields=["post", "user"], name="like_post_user_idx"),
+        ]
+class TimelineEntry(models.Model):
+    # Materialized "Following" feed: one row per post fanned out to a follower
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="timeline")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="timeline_entries")
+    # Copy of post.timestamp so a timeline page is one walk down owner_feed_idx
+    timestamp = models.DateTimeField()
+
+    def __str__(self):
+        return f"Post {self.post_id} in {self.owner_id}'s timeline"
+
+    class Meta:
+        unique_together = ("owner", "post")
+        indexes = [
+            models.Index(fields=["owner", "-timestamp", "-post"], name="timeline_owner_feed_idx"),
+        ]
+
+class Suggestion(models.Model):
+    # Precomputed "who to follow" entry, rebuilt by network.suggestions
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="suggestions")
+    candidate = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    # Accounts the owner follows that follow the candidate
+    mutuals = models.PositiveIntegerField()
+    score = models.FloatField()
+
+    def __str__(self):
+        return f"Suggest {self.candidate_id} to {self.owner_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "-score", "candidate"], name="suggestion_owner_rank_idx"),
+        ]
+
+class ArchivedPost(models.Model):
+    # A Post older than NETWORK_ARCHIVE_AFTER_DAYS, moved here by network.archive with its id
+    id = models.IntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_posts")
+    content = models.TextField(max_length=500)
+    timestamp = models.DateTimeField()
+    likes_count = models.PositiveIntegerField(default=0)
+    hot_score = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"Archived post {self.id} by {self.user_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-timestamp", "-id"], name="archived_post_feed_idx"),
+            models.Index(fields=["user", "-timestamp", "-id"], name="archived_post_author_idx"),
+        ]
+
+class ArchivedLike(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_likes")
+    post = models.ForeignKey(ArchivedPost, on_delete=models.CASCADE, related_name="likes")
+
+    def __str__(self):
+        return f"{self.user_id} likes archived post {self.post_id}"
+
+    class Meta:
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(fields=["post", "user"], name="archived_like_post_user_idx"),
+        ]
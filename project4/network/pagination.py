@@ -0,0 +1,128 @@
+import base64
+import heapq
+import json
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+
+def encode_cursor(direction, value, pk):
+    # Cursors are opaque to the client: urlsafe base64 of [direction, key, id]
+    if hasattr(value, "isoformat"):
+        value = value.isoformat()
+    raw = json.dumps([direction, value, pk], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, field):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if direction not in ("next", "prev"):
+            raise ValueError(direction)
+        return direction, field.to_python(value), int(pk)
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
+
+def _keyset_rows(queryset, order_field, pk_field, direction, value, pk, limit):
+    # Up to `limit` (key, id, row) tuples walking away from the cursor, in walk order
+    if value is None and pk is None:
+        rows = queryset.order_by(f"-{order_field}", f"-{pk_field}")
+    elif direction == "next":
+        # Everything strictly after the cursor in (key DESC, id DESC) order. The outer
+        # bound keeps SQLite on one index range instead of a MULTI-INDEX OR over both arms
+        after = Q(**{f"{order_field}__lte": value}) & (Q(**{f"{order_field}__lt": value}) | Q(**{f"{pk_field}__lt": pk}))
+        rows = queryset.filter(after).order_by(f"-{order_field}", f"-{pk_field}")
+    else:
+        # Walk backwards in ascending order; the caller flips back to newest-first
+        before = Q(**{f"{order_field}__gte": value}) & (Q(**{f"{order_field}__gt": value}) | Q(**{f"{pk_field}__gt": pk}))
+        rows = queryset.filter(before).order_by(order_field, pk_field)
+    return [(getattr(row, order_field), getattr(row, pk_field), row) for row in rows[:limit]]
+
+
+def _merge(streams, descending):
+    # One walk-ordered list of (key, id, row) from several, dropping repeated ids
+    if len(streams) == 1:
+        return streams[0]
+    merged, seen = [], set()
+    for key, row_pk, row in heapq.merge(*streams, key=lambda r: (r[0], r[1]), reverse=descending):
+        if row_pk not in seen:
+            seen.add(row_pk)
+            merged.append((key, row_pk, row))
+    return merged
+
+
+def paginate(request, queryset, per_page, order_field="timestamp", pk_field="id", also=(), legacy_queryset=None,
+             fallback=None):
+    """
+    Paginate `queryset` newest-first on (`order_field`, `pk_field`).
+
+    Requests carrying `page=` get the legacy offset paginator (over the
+    already ordered `legacy_queryset` when given) and its
+    `total_pages`/`current_page` keys.
+    Everything else is keyset paginated with opaque `next`/`prev` cursors and
+    no COUNT(*) unless `count=1`. `also` lists extra (queryset, pk_field)
+    sources sharing the same key; each is walked on its own index and the
+    results are merged, so no query has to sort a union. `fallback` is a
+    (queryset, pk_field) holding only rows older than every other source,
+    e.g. the post archive: it is read when the other sources cannot fill
+    the page, or when walking back from a cursor, and is not part of ?page=.
+    Returns the page items and the pagination keys for the JSON response.
+    Raises ValueError for a malformed cursor.
+    """
+    if "page" in request.GET:
+        if legacy_queryset is None:
+            legacy_queryset = queryset.order_by(f"-{order_field}", f"-{pk_field}")
+        paginator = Paginator(legacy_queryset, per_page)
+        page_obj = paginator.get_page(request.GET.get("page"))
+        return list(page_obj), {
+            "has_next": page_obj.has_next(),
+            "has_previous": page_obj.has_previous(),
+            "total_pages": paginator.num_pages,
+            "current_page": page_obj.number,
+        }
+
+    cursor = request.GET.get("cursor")
+    if cursor:
+        field = queryset.model._meta.get_field(order_field)
+        direction, value, pk = decode_cursor(cursor, field)
+    else:
+        direction, value, pk = "next", None, None
+
+    sources = [(queryset, pk_field), *also]
+    descending = direction == "next"
+    streams = [
+        _keyset_rows(source, order_field, source_pk, direction, value, pk, per_page + 1)
+        for source, source_pk in sources
+    ]
+    merged = _merge(streams, descending)
+    if fallback is not None and (len(merged) <= per_page or not descending):
+        source, source_pk = fallback
+        merged = _merge([merged, _keyset_rows(source, order_field, source_pk, direction, value, pk, per_page + 1)], descending)
+    more = len(merged) > per_page
+    merged = merged[:per_page]
+
+    if value is None and pk is None:
+        has_next, has_previous = more, False
+    elif descending:
+        has_next, has_previous = more, True
+    else:
+        has_next, has_previous = True, more
+        merged.reverse()
+
+    meta = {
+        "has_next": has_next,
+        "has_previous": has_previous,
+        "next": None,
+        "prev": None,
+    }
+    if merged and has_next:
+        meta["next"] = encode_cursor("next", merged[-1][0], merged[-1][1])
+    if merged and has_previous:
+        meta["prev"] = encode_cursor("prev", merged[0][0], merged[0][1])
+    if request.GET.get("count") in ("1", "true"):
+        meta["count"] = (queryset if legacy_queryset is None else legacy_queryset).count()
+        if fallback is not None:
+            meta["count"] += fallback[0].count()
+    return [row for _, _, row in merged], meta
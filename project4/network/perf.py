@@ -0,0 +1,185 @@
+"""
+Per-request performance instrumentation.
+
+PerfMiddleware samples NETWORK_PERF_SAMPLE_RATE of requests. For each
+sampled request it records wall time, SQL count and time (through an
+execute_wrapper on every database alias, read replica included), JSON encoding time (reported by
+network.responses.JsonResponse) and response size, per view. It flags
+requests that run the same SQL statement NETWORK_PERF_NPLUSONE_THRESHOLD
+or more times. Sampled responses carry a Server-Timing header; the
+rolling per-view numbers are served to staff at /debug/perf.
+"""
+import math
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+_current = ContextVar("network_perf_sample", default=None)
+
+
+def percentile(samples, pct):
+    # Nearest-rank percentile of an unsorted list
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def sample_rate():
+    return getattr(settings, "NETWORK_PERF_SAMPLE_RATE", 1.0)
+
+
+def nplusone_threshold():
+    return getattr(settings, "NETWORK_PERF_NPLUSONE_THRESHOLD", 5)
+
+
+class Sample:
+    __slots__ = ("db_ms", "queries", "serialize_ms", "statements")
+
+    def __init__(self):
+        self.db_ms = 0.0
+        self.queries = 0
+        self.serialize_ms = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook: time every query this request runs
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_ms += (time.perf_counter() - start) * 1000
+            self.queries += 1
+            self.statements[sql] += 1
+
+
+def unique_connections():
+    # Test mirrors can share one connection object between aliases; count it once
+    return list({id(conn): conn for conn in connections.all()}.values())
+
+
+@contextmanager
+def wrap_connections(wrapper):
+    """Install `wrapper` as an execute_wrapper on every database alias, e.g. the read replica."""
+    with ExitStack() as stack:
+        for conn in unique_connections():
+            stack.enter_context(conn.execute_wrapper(wrapper))
+        yield
+
+
+def record_serialization(seconds):
+    sample = _current.get()
+    if sample is not None:
+        sample.serialize_ms += seconds * 1000
+
+
+class ViewStats:
+    __slots__ = ("requests", "nplusone", "wall", "db", "serialize", "queries", "bytes", "duplicates")
+
+    def __init__(self, window):
+        self.requests = 0
+        self.nplusone = 0
+        self.wall = deque(maxlen=window)
+        self.db = deque(maxlen=window)
+        self.serialize = deque(maxlen=window)
+        self.queries = deque(maxlen=window)
+        self.bytes = deque(maxlen=window)
+        self.duplicates = Counter()
+
+    def summary(self):
+        def dist(samples):
+            if not samples:
+                return None
+            return {
+                "p50": round(percentile(samples, 50), 3),
+                "p95": round(percentile(samples, 95), 3),
+                "p99": round(percentile(samples, 99), 3),
+                "mean": round(sum(samples) / len(samples), 3),
+            }
+        return {
+            "requests": self.requests,
+            "window": len(self.wall),
+            "nplusone_requests": self.nplusone,
+            "wall_ms": dist(self.wall),
+            "db_ms": dist(self.db),
+            "serialize_ms": dist(self.serialize),
+            "python_ms": dist([w - d - s for w, d, s in zip(self.wall, self.db, self.serialize)]),
+            "queries": dist(self.queries),
+            "bytes": dist(self.bytes),
+            "duplicate_queries": [{"sql": sql, "count": n} for sql, n in self.duplicates.most_common(5)],
+        }
+
+
+class PerfRegistry:
+    def __init__(self, window=500):
+        self.window = window
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def record(self, view, wall_ms, sample, size):
+        duplicates = [(sql, n) for sql, n in sample.statements.items() if n >= nplusone_threshold()]
+        with self.lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = ViewStats(self.window)
+            stats.requests += 1
+            stats.wall.append(wall_ms)
+            stats.db.append(sample.db_ms)
+            stats.serialize.append(sample.serialize_ms)
+            stats.queries.append(sample.queries)
+            stats.bytes.append(size)
+            if duplicates:
+                stats.nplusone += 1
+                for sql, n in duplicates:
+                    stats.duplicates[sql] += n
+        return duplicates
+
+    def snapshot(self):
+        with self.lock:
+            return {view: stats.summary() for view, stats in sorted(self.views.items())}
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+
+registry = PerfRegistry()
+
+
+class PerfMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= sample_rate():
+            return self.get_response(request)
+
+        sample = Sample()
+        token = _current.set(sample)
+        start = time.perf_counter()
+        try:
+            with wrap_connections(sample):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        match = request.resolver_match
+        view = match.view_name if match else "unresolved"
+        size = 0 if response.streaming else len(response.content)
+        duplicates = registry.record(view, wall_ms, sample, size)
+
+        app_ms = max(wall_ms - sample.db_ms - sample.serialize_ms, 0)
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={sample.db_ms:.2f};desc="{sample.queries} queries"',
+            f"serialize;dur={sample.serialize_ms:.2f}",
+            f"app;dur={app_ms:.2f}",
+            f"total;dur={wall_ms:.2f}",
+        ])
+        if duplicates:
+            response["X-Duplicate-Queries"] = str(sum(n for _, n in duplicates))
+        return response
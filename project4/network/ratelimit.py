@@ -0,0 +1,254 @@
+"""
+Rate limiting and load shedding for the write endpoints.
+
+@rate_limit("<scope>") checks two token buckets before a write runs: one
+per user and one per client IP. Their rates come from
+NETWORK_RATE_LIMITS[scope], e.g. {"user": "60/m", "ip": "300/m"}. A rate
+"N/period" allows a burst of N and refills at N per period. Buckets are
+kept as GCRA "theoretical arrival times", which is the token bucket
+stored as a single float per key. A throttled request gets 429 with
+Retry-After. A request may take several tokens at once (a /batch takes
+one per operation from the operation's own scope); a full bucket allows
+even a charge larger than its burst, and is then empty for that long.
+Tokens are only taken when every bucket the request is charged to admits
+it, so a rejected request costs nothing.
+
+The store is pluggable through NETWORK_RATE_LIMIT_BACKEND:
+- MemoryBackend (the default) is per process, sharded over
+  NETWORK_RATE_LIMIT_SHARDS locks, and drops buckets that have refilled.
+- CacheBackend shares buckets between processes through the Django
+  cache, at the cost of a cache round trip per check.
+
+Wrapped views also time their INSERT/UPDATE/DELETE statements. While
+the decaying average write latency is above NETWORK_LOAD_SHED_WRITE_MS,
+new writes get 503 with Retry-After instead of queueing on the SQLite
+write lock.
+"""
+import math
+import threading
+import time
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from .responses import JsonResponse
+
+DEFAULT_BACKEND = "network.ratelimit.MemoryBackend"
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+WRITE_VERBS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def enabled():
+    return getattr(settings, "NETWORK_RATE_LIMIT_ENABLED", True)
+
+
+def parse_rate(rate):
+    """"N/period" -> (burst N, seconds per token)."""
+    count, _, period = rate.partition("/")
+    count = int(count)
+    seconds = PERIODS[period[-1]] * int(period[:-1] or 1)
+    return count, seconds / count
+
+
+def wait_time(tat, now, burst, interval, tokens):
+    # Seconds until a bucket with theoretical arrival time `tat` holds `tokens` (<= 0: now)
+    return max(tat, now) - now - (burst - min(tokens, burst)) * interval
+
+
+class MemoryBackend:
+    def __init__(self, shards=None, max_keys=None):
+        shards = shards or getattr(settings, "NETWORK_RATE_LIMIT_SHARDS", 16)
+        self.max_keys_per_shard = (max_keys or getattr(settings, "NETWORK_RATE_LIMIT_MAX_KEYS", 100000)) // shards
+        self.shards = [({}, threading.Lock()) for _ in range(shards)]
+
+    def take(self, key, burst, interval, now=None, tokens=1):
+        """Take `tokens` from `key`'s bucket; returns 0, or the seconds until they are free."""
+        now = time.monotonic() if now is None else now
+        arrivals, lock = self.shards[hash(key) % len(self.shards)]
+        with lock:
+            tat = max(arrivals.get(key, now), now)
+            wait = wait_time(tat, now, burst, interval, tokens)
+            if wait > 0:
+                return wait
+            arrivals[key] = tat + tokens * interval
+            if len(arrivals) > self.max_keys_per_shard:
+                # A bucket whose arrival time has passed is full, same as no entry
+                for stale in [k for k, t in arrivals.items() if t <= now]:
+                    del arrivals[stale]
+            return 0
+
+    def peek(self, key, burst, interval, now=None, tokens=1):
+        """The seconds until `tokens` are free in `key`'s bucket, or 0, without taking them."""
+        now = time.monotonic() if now is None else now
+        arrivals, lock = self.shards[hash(key) % len(self.shards)]
+        with lock:
+            return max(0, wait_time(arrivals.get(key, now), now, burst, interval, tokens))
+
+    def refund(self, key, interval, tokens=1):
+        arrivals, lock = self.shards[hash(key) % len(self.shards)]
+        with lock:
+            if key in arrivals:
+                arrivals[key] -= tokens * interval
+
+    def clear(self):
+        for arrivals, lock in self.shards:
+            with lock:
+                arrivals.clear()
+
+
+class CacheBackend:
+    # Shared between processes; get/set is not atomic, so bursts may overshoot slightly
+    def __init__(self):
+        self.cache = caches[getattr(settings, "NETWORK_RATE_LIMIT_CACHE_ALIAS", "default")]
+
+    def take(self, key, burst, interval, now=None, tokens=1):
+        now = time.time() if now is None else now
+        cache_key = f"network:ratelimit:{key}"
+        tat = max(self.cache.get(cache_key, now), now)
+        wait = wait_time(tat, now, burst, interval, tokens)
+        if wait > 0:
+            return wait
+        tat += tokens * interval
+        self.cache.set(cache_key, tat, timeout=math.ceil(tat - now) + 1)
+        return 0
+
+    def peek(self, key, burst, interval, now=None, tokens=1):
+        now = time.time() if now is None else now
+        return max(0, wait_time(self.cache.get(f"network:ratelimit:{key}", now), now, burst, interval, tokens))
+
+    def refund(self, key, interval, tokens=1):
+        cache_key = f"network:ratelimit:{key}"
+        tat = self.cache.get(cache_key)
+        if tat is not None:
+            self.cache.set(cache_key, tat - tokens * interval, timeout=max(1, math.ceil(tat - time.time())))
+
+    def clear(self):
+        pass
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(getattr(settings, "NETWORK_RATE_LIMIT_BACKEND", DEFAULT_BACKEND))()
+
+
+class WriteLatency:
+    """Average write-statement latency in ms, halving every `half_life` seconds without writes."""
+
+    def __init__(self, weight=0.2, half_life=1.0):
+        self.weight = weight
+        self.half_life = half_life
+        self.lock = threading.Lock()
+        self.value = 0.0
+        self.updated = time.monotonic()
+
+    def current(self, now=None):
+        now = time.monotonic() if now is None else now
+        return self.value * 0.5 ** ((now - self.updated) / self.half_life)
+
+    def observe(self, ms):
+        now = time.monotonic()
+        with self.lock:
+            self.value = self.current(now) * (1 - self.weight) + ms * self.weight
+            self.updated = now
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook: time write statements only
+        if not sql.lstrip().upper().startswith(WRITE_VERBS):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.observe((time.perf_counter() - start) * 1000)
+
+    def reset(self):
+        with self.lock:
+            self.value = 0.0
+
+
+write_latency = WriteLatency()
+
+
+def shed_threshold():
+    return getattr(settings, "NETWORK_LOAD_SHED_WRITE_MS", 250)
+
+
+def client_ip(request):
+    header = getattr(settings, "NETWORK_RATE_LIMIT_IP_HEADER", None)
+    if header and request.META.get(header):
+        return request.META[header].split(",")[0].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def buckets(request, scope):
+    # (key, burst, interval) of each bucket `request` draws on for `scope`
+    rates = getattr(settings, "NETWORK_RATE_LIMITS", {}).get(scope, {})
+    keys = []
+    if "user" in rates and request.user.is_authenticated:
+        keys.append((f"{scope}:user:{request.user.id}", *parse_rate(rates["user"])))
+    if "ip" in rates:
+        keys.append((f"{scope}:ip:{client_ip(request)}", *parse_rate(rates["ip"])))
+    return keys
+
+
+def charge(request, tokens_by_scope):
+    """
+    Take tokens_by_scope[scope] tokens from each of `request`'s buckets for
+    every scope, or none at all. Returns 0, or the seconds until all of them
+    would admit the request.
+    """
+    backend = get_backend()
+    charges = [(bucket, tokens) for scope, tokens in tokens_by_scope.items() for bucket in buckets(request, scope)]
+    wait = max((backend.peek(*bucket, tokens=tokens) for bucket, tokens in charges), default=0)
+    if wait:
+        return wait
+    taken = []
+    for (key, burst, interval), tokens in charges:
+        wait = backend.take(key, burst, interval, tokens=tokens)
+        if wait:
+            # Lost a race with another request since the peek: give back what was taken
+            for key, interval, tokens in taken:
+                backend.refund(key, interval, tokens)
+            return wait
+        taken.append((key, interval, tokens))
+    return 0
+
+
+def check(request, scope, tokens=1):
+    """0 if `request` may run `scope` `tokens` times, else the seconds until it may."""
+    return charge(request, {scope: tokens})
+
+
+def too_many(message, status, retry_after):
+    response = JsonResponse({"error": message}, status=status)
+    response["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def rate_limit(scope, methods=("POST",)):
+    """Throttle `methods` requests to the view per NETWORK_RATE_LIMITS[scope]; shed them under write load."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods or not enabled():
+                return view(request, *args, **kwargs)
+            latency = write_latency.current()
+            if latency > shed_threshold():
+                # Roughly when the average decays back under the threshold
+                retry = write_latency.half_life * math.log2(latency / shed_threshold())
+                return too_many("The server is busy; try again shortly.", 503, retry)
+            wait = check(request, scope)
+            if wait:
+                return too_many("Too many requests.", 429, wait)
+            with connection.execute_wrapper(write_latency):
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def reset():
+    get_backend().clear()
+    write_latency.reset()
@@ -0,0 +1,87 @@
+"""
+JSON responses and their encoding on the wire.
+
+JsonResponse reports its encoding time to PerfMiddleware and writes
+compact JSON. CompressionMiddleware gzips or deflates JSON bodies of at
+least NETWORK_COMPRESS_MIN_BYTES, whichever the client's Accept-Encoding
+prefers (gzip on a tie). As in django.middleware.gzip, a compressed
+response's ETag is made weak, since its bytes differ from the identity
+encoding; feed_condition's weak If-None-Match comparison still matches it.
+"""
+import gzip
+import time
+import zlib
+
+from django.conf import settings
+from django.http import JsonResponse as DjangoJsonResponse
+from django.utils.cache import patch_vary_headers
+
+from . import perf
+
+# Supported codings, in order of preference when the client weighs them equally
+CODINGS = ("gzip", "deflate")
+
+
+class JsonResponse(DjangoJsonResponse):
+    """django.http.JsonResponse that reports its encoding time to PerfMiddleware."""
+
+    def __init__(self, data, *args, json_dumps_params=None, **kwargs):
+        start = time.perf_counter()
+        super().__init__(data, *args, json_dumps_params={"separators": (",", ":"), **(json_dumps_params or {})}, **kwargs)
+        perf.record_serialization(time.perf_counter() - start)
+
+
+def negotiate(accept_encoding):
+    """The client's preferred coding of CODINGS per an Accept-Encoding header, or None."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, *params = part.split(";")
+        weight = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.strip().lower()] = weight
+    default = weights.get("*", 0.0)
+    best = max(CODINGS, key=lambda coding: weights.get(coding, default))
+    return best if weights.get(best, default) > 0 else None
+
+
+def compress(coding, body):
+    level = getattr(settings, "NETWORK_COMPRESS_LEVEL", 6)
+    if coding == "gzip":
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    return zlib.compress(body, level)
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (response.streaming or response.has_header("Content-Encoding")
+                or not response.get("Content-Type", "").startswith("application/json")):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if len(response.content) < getattr(settings, "NETWORK_COMPRESS_MIN_BYTES", 1024):
+            return response
+        coding = negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if coding is None:
+            return response
+
+        start = time.perf_counter()
+        body = compress(coding, response.content)
+        perf.record_serialization(time.perf_counter() - start)
+        if len(body) >= len(response.content):
+            return response
+        response.content = body
+        response["Content-Length"] = str(len(body))
+        response["Content-Encoding"] = coding
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = f"W/{etag}"
+        return response
@@ -0,0 +1,54 @@
+"""
+Read/write split for the SQLite production profile.
+
+Views wrapped in @read_replica send their ORM reads to the
+NETWORK_READ_DATABASE alias (a second, read-only connection to the same
+file) for GET and HEAD requests. Everything else, including any read made
+inside a transaction on the default connection, stays on "default".
+Under WAL the read-only connection sees every committed write and never
+waits on a writer.
+"""
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_reading = ContextVar("network_read_replica", default=False)
+
+
+def read_alias():
+    # None when no read-only alias is configured (the development profile)
+    alias = getattr(settings, "NETWORK_READ_DATABASE", None)
+    return alias if alias in settings.DATABASES else None
+
+
+def read_replica(view):
+    """Route the ORM reads of a safe request to the read-only alias."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or read_alias() is None:
+            return view(request, *args, **kwargs)
+        token = _reading.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _reading.reset(token)
+    return wrapper
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _reading.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database file
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,112 @@
+"""
+Full-text post search.
+
+On SQLite, posts are indexed in the network_post_fts FTS5 table (migration
+0006), which triggers keep in sync with every insert, content update and
+delete on network_post. Results are ranked by BM25 and keyset paginated
+on (score, id) with the same opaque cursors as the feeds. Scores depend on
+corpus statistics, so a page walk that spans many new posts may shift by a
+row or two. Other databases fall back to a newest-first icontains filter.
+"""
+import re
+
+from django.db import connection, connections, router
+from django.db.models import FloatField
+
+from .models import Post
+from .pagination import decode_cursor, encode_cursor, paginate
+
+FTS_TABLE = "network_post_fts"
+TERM = re.compile(r"\w+")
+
+
+def match_expression(query):
+    # Quote every word so user input can never be read as FTS5 syntax; terms are ANDed
+    return " ".join(f'"{term}"' for term in TERM.findall(query))
+
+
+def available(using):
+    return connections[using].vendor == "sqlite"
+
+
+def _ranked_rows(using, expression, author_id, direction, score, pk, limit):
+    # Up to `limit` (score, id) pairs walking away from the cursor, in walk order
+    params = [expression]
+    join = author = ""
+    if author_id is not None:
+        # CROSS JOIN keeps the full-text match as the outer loop; driving from the
+        # author's posts would rerun the match once per post
+        post_table = Post._meta.db_table
+        join = f"CROSS JOIN {post_table} ON {post_table}.id = {FTS_TABLE}.rowid"
+        author = f"AND {post_table}.user_id = %s"
+        params.append(author_id)
+    if score is None and pk is None:
+        where, order = "", "score DESC, id DESC"
+    elif direction == "next":
+        where, order = "WHERE score < %s OR (score = %s AND id < %s)", "score DESC, id DESC"
+        params += [score, score, pk]
+    else:
+        where, order = "WHERE score > %s OR (score = %s AND id > %s)", "score ASC, id ASC"
+        params += [score, score, pk]
+    sql = (
+        f"SELECT id, score FROM ("
+        f"SELECT {FTS_TABLE}.rowid AS id, -{FTS_TABLE}.rank AS score FROM {FTS_TABLE} {join} "
+        f"WHERE {FTS_TABLE} MATCH %s {author}"
+        f") {where} ORDER BY {order} LIMIT %s"
+    )
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+
+def search_page(request, queryset, query, per_page, author_id=None):
+    """
+    One page of posts from `queryset` matching `query`, best match first,
+    and its pagination keys. Raises ValueError for an empty query or a
+    malformed cursor.
+    """
+    expression = match_expression(query)
+    if not expression:
+        raise ValueError("Search query required.")
+
+    using = router.db_for_read(Post)
+    if not available(using):
+        matches = queryset.filter(content__icontains=query)
+        if author_id is not None:
+            matches = matches.filter(user_id=author_id)
+        return paginate(request, matches, per_page)
+
+    cursor = request.GET.get("cursor")
+    if cursor:
+        direction, score, pk = decode_cursor(cursor, FloatField())
+    else:
+        direction, score, pk = "next", None, None
+    rows = _ranked_rows(using, expression, author_id, direction, score, pk, per_page + 1)
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if score is None and pk is None:
+        has_next, has_previous = more, False
+    elif direction == "next":
+        has_next, has_previous = more, True
+    else:
+        has_next, has_previous = True, more
+        rows.reverse()
+
+    by_id = queryset.in_bulk([pk for pk, _ in rows])
+    page = [by_id[pk] for pk, _ in rows if pk in by_id]
+    meta = {
+        "has_next": has_next,
+        "has_previous": has_previous,
+        "next": encode_cursor("next", rows[-1][1], rows[-1][0]) if rows and has_next else None,
+        "prev": encode_cursor("prev", rows[0][1], rows[0][0]) if rows and has_previous else None,
+    }
+    return page, meta
+
+
+def rebuild_index():
+    """Reindex every post from network_post and merge the index segments. Returns the post count."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return Post.objects.count()
@@ -0,0 +1,138 @@
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import auth, feedcache, graphcache, stream, timeline
+from .hot import rescored
+from .hydration import serialize_posts
+from .models import User, Post, Follow, Like
+
+
+@receiver(post_save, sender=Like)
+def like_created(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(
+            likes_count=F("likes_count") + 1, hot_score=rescored(F("likes_count") + 1)
+        )
+
+
+@receiver(post_delete, sender=Like)
+def like_deleted(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id, likes_count__gt=0).update(
+        likes_count=F("likes_count") - 1, hot_score=rescored(F("likes_count") - 1)
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.follower_id).update(
+            following_count=F("following_count") + 1, suggestions_stale=True
+        )
+        User.objects.filter(pk=instance.following_id).update(followers_count=F("followers_count") + 1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.follower_id, following_count__gt=0).update(
+        following_count=F("following_count") - 1, suggestions_stale=True
+    )
+    User.objects.filter(pk=instance.following_id, followers_count__gt=0).update(followers_count=F("followers_count") - 1)
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_backfill(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.follower_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_purge(sender, instance, **kwargs):
+    timeline.purge(instance.follower_id, instance.following_id)
+
+
+# Cached feed and profile pages are invalidated by bumping their versions
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    feedcache.bump("feed", f"profile:{instance.user_id}")
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def like_changed(sender, instance, **kwargs):
+    author_id = Post.objects.filter(pk=instance.post_id).values_list("user_id", flat=True).first()
+    feedcache.bump("feed", f"profile:{author_id}")
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    feedcache.bump(f"profile:{instance.follower_id}", f"profile:{instance.following_id}")
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, **kwargs):
+    feedcache.bump(f"profile:{instance.id}")
+
+
+# In-process username and following-set lookups (see network.graphcache)
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_graph_changed(sender, instance, **kwargs):
+    # Again on commit, in case another request reloaded the set before it
+    graphcache.forget_following(instance.follower_id)
+    transaction.on_commit(lambda: graphcache.forget_following(instance.follower_id))
+
+
+@receiver(post_save, sender=User)
+def user_renamed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "username" in update_fields:
+        graphcache.forget_user(instance.id)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    graphcache.forget_user(instance.id)
+
+
+# Cached request.user (see network.auth)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_edited(sender, instance, **kwargs):
+    # Again on commit, in case another request reloaded the old row before it
+    auth.forget_user(instance.id)
+    transaction.on_commit(lambda: auth.forget_user(instance.id))
+
+
+@receiver(user_logged_out)
+def user_left(sender, request, user, **kwargs):
+    if user is not None:
+        auth.forget_user(user.id)
+
+
+# Live updates for /stream subscribers, sent once the write is committed
+
+@receiver(post_save, sender=Post)
+def post_published(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: stream.publish("post", **serialize_posts([instance])[0]))
+    else:
+        transaction.on_commit(lambda: stream.publish("edit", id=instance.id, content=instance.content))
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def like_published(sender, instance, **kwargs):
+    transaction.on_commit(lambda: stream.publish_like_counts([instance.post_id]))
@@ -0,0 +1,30 @@
+"""
+SQLite connection tuning for the production profile.
+
+Every new SQLite connection runs the PRAGMAs in NETWORK_SQLITE_PRAGMAS.
+journal_mode is stored in the database file, so it is only set from
+writable connections; the read-only alias inherits it.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# PRAGMAs that write to the database file
+PERSISTENT_PRAGMAS = {"journal_mode"}
+
+
+def is_read_only(connection):
+    return "mode=ro" in str(connection.settings_dict["NAME"])
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    pragmas = getattr(settings, "NETWORK_SQLITE_PRAGMAS", None)
+    if connection.vendor != "sqlite" or not pragmas:
+        return
+    read_only = is_read_only(connection)
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            if read_only and name in PERSISTENT_PRAGMAS:
+                continue
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -24,19 +24,37 @@ document.addEventListener('DOMContentLoaded', function() {
         fetchingPosts();
     });
 
+    // Trending: the same feed ranked by time-decayed likes
+    document.querySelector('#trending-btn').addEventListener('click', () => fetchingPosts('', 'hot'));
+
     document.querySelector('#new-post').addEventListener('click', () => postNew());
     document.querySelector('#following').addEventListener('click', () => showFollowing());
 
-    // Fetch posts when the page loads
-    fetchingPosts();
+    // The server embeds the first page (see views.index); show it without fetching
+    const preload = document.getElementById('preload');
+    const initial = preload ? JSON.parse(preload.textContent) : null;
+    if (initial && initial.view === 'profile') {
+        showProfile(initial.username, initial.cursor, initial.data);
+    } else if (initial) {
+        fetchingPosts(initial.cursor, initial.sort, initial.data);
+    } else {
+        fetchingPosts();
+    }
+
+    // Receive new posts, edits and like counts live instead of refetching
+    if (document.querySelector('#profileName')) {
+        openLiveStream();
+    }
 });
 
-function fetchingPosts(page = 1) {
-    history.pushState({ view: 'posts', page: page }, "", `/posts?page=${page}`);
-    fetch(`/posts?page=${page}`, {
-        method: 'GET'
-    })
-    .then(response => response.json())
+// The feed currently on screen, so live updates know where they belong
+let currentView = { view: 'posts', cursor: '', sort: 'new' };
+
+// `preloaded` is a page the server already embedded, shown without a request
+function fetchingPosts(cursor = '', sort = 'new', preloaded = null) {
+    currentView = { view: 'posts', cursor: cursor, sort: sort };
+    showState({ view: 'posts', cursor: cursor, sort: sort }, `/?sort=${sort}&cursor=${cursor}`, preloaded);
+    loadPage(`/posts?sort=${sort}&cursor=${cursor}`, preloaded)
     .then(data => {
         const mainContent = document.getElementById('body');
         mainContent.innerHTML = '';
@@ -48,17 +66,16 @@ function fetchingPosts(page = 1) {
 
         // Create pagination buttons
         const paginationContainer = createPaginationButtons(
-            data.has_previous, 
-            data.has_next, 
-            data.current_page, 
-            fetchingPosts // Pass fetchingPosts as the callback
+            data.prev, 
+            data.next, 
+            nextCursor => fetchingPosts(nextCursor, sort)
         );
         mainContent.appendChild(paginationContainer);
     })
     .catch(error => console.error('Error fetching posts:', error));
 }
 
-function appendPost(post, container = null) {
+function appendPost(post, container = null, prepend = false) {
     const timestamp = new Date(post.timestamp);
     const formattedTimestamp = timestamp.toLocaleString(undefined, {
         year: 'numeric',
@@ -95,7 +112,11 @@ function appendPost(post, container = null) {
     postDiv.classList.add('post-animation');
     postDiv.innerHTML = postHtml;
 
-    container.appendChild(postDiv); // Append to the provided container
+    if (prepend) {
+        container.prepend(postDiv); // Live posts go on top
+    } else {
+        container.appendChild(postDiv); // Append to the provided container
+    }
 
     // Add the click event listener to the username link
     postDiv.querySelector('.post-username').addEventListener('click', function() {
@@ -195,16 +216,14 @@ function toggleLike(event) {
     });
 }
 
-function showProfile(username, page = 1) {
-    history.pushState({ view: 'profile', username: username, page: page }, "", `/profile/${username}?page=${page}`);
+function showProfile(username, cursor = '', preloaded = null) {
+    currentView = { view: 'profile', username: username, cursor: cursor };
+    showState({ view: 'profile', username: username, cursor: cursor }, `/users/${username}?cursor=${cursor}`, preloaded);
     // Clear previous content
     document.getElementById('body').innerHTML = '';
 
     // Fetch profile data with pagination
-    fetch(`/profile/${username}?page=${page}`, {
-        method: 'GET'
-    })
-    .then(response => response.json())
+    loadPage(`/profile/${username}?cursor=${cursor}`, preloaded)
     .then(profile => {
         console.log("Received profile data:", profile);
 
@@ -253,10 +272,9 @@ function showProfile(username, page = 1) {
 
         // Create pagination buttons
         const paginationContainer = createPaginationButtons(
-            profile.has_previous, 
-            profile.has_next, 
-            profile.current_page, 
-            (newPage) => showProfile(username, newPage)  // Use showProfile with the username and new page
+            profile.prev, 
+            profile.next, 
+            (newCursor) => showProfile(username, newCursor)  // Use showProfile with the username and new cursor
         );
         mainContent.appendChild(paginationContainer);
     })
@@ -346,6 +364,113 @@ function postSubmittion() {
     });
 }
 
+// Feed responses we already have, keyed by URL, with the ETag they came with
+const feedCache = new Map();
+
+// GET a feed URL, revalidating with If-None-Match and reusing the body on a 304
+function cachedFetch(url) {
+    const cached = feedCache.get(url);
+    const headers = cached ? { 'If-None-Match': cached.etag } : {};
+
+    return fetch(url, { method: 'GET', headers: headers })
+    .then(response => {
+        if (response.status === 304 && cached) {
+            return cached.data;
+        }
+        return response.json().then(data => {
+            const etag = response.headers.get('ETag');
+            if (response.ok && etag) {
+                feedCache.set(url, { etag: etag, data: data });
+            }
+            return data;
+        });
+    });
+}
+
+// The embedded page when there is one, else the page from the server
+function loadPage(url, preloaded) {
+    return preloaded ? Promise.resolve(preloaded) : cachedFetch(url);
+}
+
+// Record a view in the history; the page the server rendered replaces its own entry
+function showState(state, url, preloaded) {
+    if (preloaded) {
+        history.replaceState(state, "", location.href);
+    } else {
+        history.pushState(state, "", url);
+    }
+}
+
+// Server-Sent Events from /stream; the browser reconnects on its own
+function openLiveStream() {
+    const source = new EventSource('/stream');
+    const loggedInUsername = document.querySelector('#profileName').getAttribute('data-username');
+
+    // No stream (204 under a WSGI server, or 503 when full): poll instead
+    source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) {
+            pollPosts();
+        }
+    };
+
+    source.addEventListener('post', event => {
+        const post = JSON.parse(event.data);
+        // Only the first page of All Posts shows brand new posts
+        if (currentView.view === 'posts' && currentView.sort === 'new' && !currentView.cursor) {
+            post.is_liked = false;
+            post.is_owner = post.user === loggedInUsername;
+            appendPost(post, document.getElementById('body'), true);
+        }
+    });
+
+    source.addEventListener('edit', event => {
+        const post = JSON.parse(event.data);
+        const likeButton = document.querySelector(`.like-btn[data-post-id="${post.id}"]`);
+        if (likeButton) {
+            likeButton.closest('.card-body').querySelector('.card-text').innerText = post.content;
+        }
+    });
+
+    source.addEventListener('like', event => {
+        const post = JSON.parse(event.data);
+        const likeButton = document.querySelector(`.like-btn[data-post-id="${post.id}"]`);
+        if (likeButton) {
+            likeButton.nextElementSibling.textContent = ` Likes: ${post.like_count}`;
+        }
+    });
+
+    // We fell too far behind to replay events; redraw what is on screen
+    source.addEventListener('resync', () => {
+        if (currentView.view === 'profile') {
+            showProfile(currentView.username, currentView.cursor);
+        } else if (currentView.view === 'following') {
+            showFollowing(currentView.cursor);
+        } else if (currentView.view === 'posts') {
+            fetchingPosts(currentView.cursor, currentView.sort);
+        }
+    });
+}
+
+// Refresh the first page of All Posts every POLL_INTERVAL ms; a 304 costs no redraw
+const POLL_INTERVAL = 15000;
+
+function pollPosts() {
+    setInterval(() => {
+        if (currentView.view !== 'posts' || currentView.cursor) {
+            return;
+        }
+        const url = `/posts?sort=${currentView.sort}&cursor=`;
+        const before = feedCache.get(url);
+        cachedFetch(url)
+        .then(data => {
+            if (!before || data !== before.data) {
+                fetchingPosts('', currentView.sort, data);
+            }
+        })
+        .catch(error => console.error('Error polling posts:', error));
+    }, POLL_INTERVAL);
+}
+
 // CSRF token helper function
 function getCookie(name) {
     let cookieValue = null;
@@ -362,16 +487,14 @@ function getCookie(name) {
     return cookieValue;
 }
 
-function showFollowing(page = 1) {
-    history.pushState({ view: 'following', page: page }, "", `/following?page=${page}`);
+function showFollowing(cursor = '') {
+    currentView = { view: 'following', cursor: cursor };
+    history.pushState({ view: 'following', cursor: cursor }, "", `/following?cursor=${cursor}`);
     // Clear previous content
     document.getElementById('body').innerHTML = '';
 
     // Fetch following posts with pagination
-    fetch(`/following?page=${page}`, {
-        method: 'GET'
-    })
-    .then(response => response.json())
+    cachedFetch(`/following?cursor=${cursor}`)
     .then(data => {
         console.log("Received following posts:", data.posts);
 
@@ -389,9 +512,8 @@ function showFollowing(page = 1) {
 
         // Create pagination buttons using the reusable function
         const paginationContainer = createPaginationButtons(
-            data.has_previous, 
-            data.has_next, 
-            data.current_page, 
+            data.prev, 
+            data.next, 
             showFollowing // Pass showFollowing as the callback for pagination
         );
 
@@ -420,23 +542,24 @@ function showAlert(message, type = 'danger') {
     }, 3000);
   }
 
-function createPaginationButtons(hasPrevious, hasNext, currentPage, callback) {
+// prevCursor/nextCursor are the opaque cursors returned by the feed endpoints
+function createPaginationButtons(prevCursor, nextCursor, callback) {
     const paginationContainer = document.createElement('div');
     paginationContainer.classList.add('pagination-container', 'mt-3');
 
-    if (hasPrevious) {
+    if (prevCursor) {
         const prevButton = document.createElement('button');
         prevButton.textContent = "Previous";
         prevButton.classList.add('btn', 'btn-success', 'me-2');
-        prevButton.addEventListener('click', () => callback(currentPage - 1));
+        prevButton.addEventListener('click', () => callback(prevCursor));
         paginationContainer.appendChild(prevButton);
     }
 
-    if (hasNext) {
+    if (nextCursor) {
         const nextButton = document.createElement('button');
         nextButton.textContent = "Next";
         nextButton.classList.add('btn', 'btn-success');
-        nextButton.addEventListener('click', () => callback(currentPage + 1));
+        nextButton.addEventListener('click', () => callback(nextCursor));
         paginationContainer.appendChild(nextButton);
     }
 
@@ -447,11 +570,11 @@ function createPaginationButtons(hasPrevious, hasNext, currentPage, callback) {
 window.onpopstate = function(event) {
     if (event.state) {
         if (event.state.view === 'profile') {
-            showProfile(event.state.username, event.state.page);
+            showProfile(event.state.username, event.state.cursor);
         } else if (event.state.view === 'following') {
-            showFollowing(event.state.page);
+            showFollowing(event.state.cursor);
         } else if (event.state.view === 'posts') {
-            fetchingPosts(event.state.page);
+            fetchingPosts(event.state.cursor, event.state.sort);
         }
     }
 };
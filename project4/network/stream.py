@@ -0,0 +1,104 @@
+"""
+In-process pub/sub behind the /stream Server-Sent Events endpoint.
+
+Publishers (model signals, the like buffer) run in ordinary sync code and
+hand events to each subscriber's event loop thread-safely. Each subscriber
+has a bounded queue; a client that falls that far behind gets its queue
+replaced by a single "resync" event and refetches instead of holding
+memory. Connections beyond NETWORK_STREAM_MAX_CONNECTIONS are refused.
+Streaming needs an ASGI server: under WSGI the view answers 204 at once,
+since the response could never finish, and app.js falls back to polling.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Post
+
+RESYNC = {"type": "resync"}
+
+
+def max_connections():
+    return getattr(settings, "NETWORK_STREAM_MAX_CONNECTIONS", 100)
+
+
+def queue_size():
+    return getattr(settings, "NETWORK_STREAM_QUEUE_SIZE", 100)
+
+
+class Broker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def has_subscribers(self):
+        return bool(self.subscribers)
+
+    def subscribe(self):
+        """Return a new subscriber queue, or None when the connection cap is reached."""
+        queue = asyncio.Queue(maxsize=queue_size())
+        with self.lock:
+            if len(self.subscribers) >= max_connections():
+                return None
+            self.subscribers[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue):
+        with self.lock:
+            self.subscribers.pop(queue, None)
+
+    def publish(self, event):
+        with self.lock:
+            subscribers = list(self.subscribers.items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # The subscriber's loop is gone; its stream will unsubscribe itself
+                pass
+
+    @staticmethod
+    def _offer(queue, event):
+        if queue.full():
+            while not queue.empty():
+                queue.get_nowait()
+            event = RESYNC
+        queue.put_nowait(event)
+
+
+broker = Broker()
+
+
+def publish(event_type, **data):
+    if broker.has_subscribers():
+        broker.publish({"type": event_type, **data})
+
+
+def publish_like_counts(post_ids):
+    # Only pay for the counter read when someone is listening
+    if broker.has_subscribers() and post_ids:
+        for post_id, like_count in Post.objects.filter(pk__in=post_ids).values_list("id", "likes_count"):
+            broker.publish({"type": "like", "id": post_id, "like_count": like_count})
+
+
+def format_event(event):
+    data = json.dumps({key: value for key, value in event.items() if key != "type"}, cls=DjangoJSONEncoder)
+    return f"event: {event['type']}\ndata: {data}\n\n"
+
+
+async def event_stream(queue, keepalive=15):
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                # Comment lines keep proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(queue)
@@ -0,0 +1,221 @@
+"""
+Fan-out-on-write home timelines for the Following feed.
+
+New posts are pushed into each follower's timeline when they are created,
+so reading the feed is a lookup on the viewer's own entries instead of an
+IN-list over everyone they follow. Authors with at least
+NETWORK_FANOUT_THRESHOLD followers are not fanned out; their posts are
+merged in at read time so a single post never costs millions of writes.
+An author whose post is skipped is marked timeline_pulled, and stays
+pulled (new posts skipped too) after dropping back below the threshold,
+so unfollowing never has to copy posts into other timelines. The
+rebuild_timelines command (--pulled) later materializes the posts of
+pulled authors now under the threshold, one author per transaction, and
+clears the mark.
+
+The store is pluggable through NETWORK_TIMELINE_BACKEND.
+"""
+import threading
+from collections import defaultdict, deque
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .hydration import post_values
+from .models import User, Post, Follow, TimelineEntry, ArchivedPost
+from .pagination import paginate
+
+DEFAULT_BACKEND = "network.timeline.DatabaseTimelineBackend"
+
+
+def fanout_threshold():
+    return getattr(settings, "NETWORK_FANOUT_THRESHOLD", 1000)
+
+
+class DatabaseTimelineBackend:
+    """Timelines materialized as TimelineEntry rows."""
+
+    def add(self, post, owner_ids):
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner_id=owner_id, post=post, timestamp=post.timestamp) for owner_id in owner_ids],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+
+    def backfill(self, owner_id, posts):
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner_id=owner_id, post_id=post_id, timestamp=timestamp) for post_id, timestamp in posts],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+
+    def purge(self, owner_id, author_id):
+        TimelineEntry.objects.filter(owner_id=owner_id, post__user_id=author_id).delete()
+
+    def post_ids(self, owner_id):
+        return TimelineEntry.objects.filter(owner_id=owner_id).values("post_id")
+
+    def source(self, owner_id):
+        # Entries are keyed like posts: (timestamp, post_id) on timeline_owner_feed_idx
+        return TimelineEntry.objects.filter(owner_id=owner_id).select_related("post__user"), "post_id"
+
+
+class InMemoryTimelineBackend:
+    """
+    Per-process timelines holding the newest `maxlen` post ids per owner.
+
+    Only suitable for a single process; entries are lost on restart.
+    """
+
+    def __init__(self, maxlen=800):
+        self.maxlen = maxlen
+        self.lock = threading.Lock()
+        self.timelines = defaultdict(lambda: deque(maxlen=self.maxlen))
+        self.authors = {}
+
+    def add(self, post, owner_ids):
+        with self.lock:
+            self.authors[post.id] = post.user_id
+            for owner_id in owner_ids:
+                self.timelines[owner_id].append(post.id)
+
+    def backfill(self, owner_id, posts):
+        post_ids = [post_id for post_id, _ in posts]
+        with self.lock:
+            timeline = self.timelines[owner_id]
+            merged = sorted(set(timeline).union(post_ids))[-self.maxlen:]
+            timeline.clear()
+            timeline.extend(merged)
+        self.authors.update(Post.objects.filter(id__in=post_ids).values_list("id", "user_id"))
+
+    def purge(self, owner_id, author_id):
+        with self.lock:
+            timeline = self.timelines.get(owner_id)
+            if timeline:
+                kept = [post_id for post_id in timeline if self.authors.get(post_id) != author_id]
+                timeline.clear()
+                timeline.extend(kept)
+
+    def post_ids(self, owner_id):
+        with self.lock:
+            return list(self.timelines.get(owner_id, ()))
+
+    def source(self, owner_id):
+        return Post.objects.filter(id__in=self.post_ids(owner_id)).select_related("user"), "id"
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(getattr(settings, "NETWORK_TIMELINE_BACKEND", DEFAULT_BACKEND))()
+
+
+def fan_out(post):
+    # Push a new post to its author's followers, unless the author is too big.
+    # The state is read fresh: post.user may be a cached request.user (network.auth)
+    author = User.objects.filter(pk=post.user_id).values_list("followers_count", "timeline_pulled").first()
+    if author is None:
+        return
+    followers, pulled = author
+    if pulled or followers >= fanout_threshold():
+        if not pulled:
+            User.objects.filter(pk=post.user_id).update(timeline_pulled=True)
+        return
+    follower_ids = Follow.objects.filter(following_id=post.user_id).values_list("follower_id", flat=True)
+    get_backend().add(post, list(follower_ids))
+
+
+def backfill(owner_id, author_id, limit=200):
+    # Bring an author's recent posts into a new follower's timeline
+    posts = Post.objects.filter(user_id=author_id).order_by("-timestamp", "-id").values_list("id", "timestamp")[:limit]
+    get_backend().backfill(owner_id, list(posts))
+
+
+def purge(owner_id, author_id):
+    get_backend().purge(owner_id, author_id)
+
+
+def pulled_authors(viewer):
+    # Followed authors not fanned out; their posts are read on demand
+    return Follow.objects.filter(follower=viewer, following__timeline_pulled=True).values_list("following_id", flat=True)
+
+
+def timeline_queryset(viewer):
+    """Posts in `viewer`'s Following feed: their timeline plus high-follower authors read on demand."""
+    return Post.objects.filter(Q(id__in=get_backend().post_ids(viewer.id)) | Q(user_id__in=pulled_authors(viewer)))
+
+
+def timeline_page(request, viewer, per_page):
+    """
+    One page of `viewer`'s Following feed as (post_values() rows, pagination keys).
+
+    The timeline and each pulled author are walked on their own index and
+    merged by paginate(), instead of sorting an OR over the Post table.
+    """
+    source, pk_field = get_backend().source(viewer.id)
+    source = post_values(source, relation="post" if source.model is TimelineEntry else None)
+    also = [(post_values(Post.objects.filter(user_id=author_id)), "id") for author_id in pulled_authors(viewer)]
+    # ?page= over a single source can use its index; only a merge needs the OR query
+    legacy = post_values(timeline_queryset(viewer).order_by("-timestamp", "-id")) if also else None
+    # Archived posts have no timeline entries; followed authors' ones are read past the hot window
+    archived = post_values(ArchivedPost.objects.filter(
+        user_id__in=Follow.objects.filter(follower_id=viewer.id).values("following_id")
+    ))
+    return paginate(request, source, per_page, pk_field=pk_field, also=also, legacy_queryset=legacy,
+                    fallback=(archived, "id"))
+
+
+def rebuild_timelines():
+    """
+    Re-materialize every TimelineEntry from Follow and Post.
+
+    One INSERT ... SELECT, for bulk imports and seeding where per-row
+    signals never ran. Authors over the threshold are left pulled and
+    everyone else is not. Returns the number of entries written.
+    """
+    qn = connection.ops.quote_name
+    entry, follow, post, user = (qn(model._meta.db_table) for model in (TimelineEntry, Follow, Post, User))
+    with transaction.atomic():
+        TimelineEntry.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {entry} (owner_id, post_id, timestamp) "
+                f"SELECT f.follower_id, p.id, p.timestamp FROM {follow} f "
+                f"INNER JOIN {user} u ON u.id = f.following_id "
+                f"INNER JOIN {post} p ON p.user_id = f.following_id "
+                f"WHERE u.followers_count < %s",
+                [fanout_threshold()],
+            )
+            written = cursor.rowcount
+        User.objects.filter(followers_count__gte=fanout_threshold(), timeline_pulled=False).update(timeline_pulled=True)
+        User.objects.filter(followers_count__lt=fanout_threshold(), timeline_pulled=True).update(timeline_pulled=False)
+    return written
+
+
+def materialize_pulled():
+    """
+    Fan out the posts of pulled authors who are back under the threshold.
+
+    One INSERT ... SELECT and one transaction per author, off the request
+    path. Returns (authors, entries written).
+    """
+    qn = connection.ops.quote_name
+    entry, follow, post = (qn(model._meta.db_table) for model in (TimelineEntry, Follow, Post))
+    authors = entries = 0
+    pulled = User.objects.filter(timeline_pulled=True, followers_count__lt=fanout_threshold())
+    for author_id in list(pulled.values_list("id", flat=True)):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {entry} (owner_id, post_id, timestamp) "
+                f"SELECT f.follower_id, p.id, p.timestamp FROM {follow} f "
+                f"INNER JOIN {post} p ON p.user_id = f.following_id "
+                f"WHERE f.following_id = %s ON CONFLICT DO NOTHING",
+                [author_id],
+            )
+            entries += cursor.rowcount
+            # Still under the threshold now that the write lock is held; otherwise stay pulled
+            authors += User.objects.filter(pk=author_id, followers_count__lt=fanout_threshold()).update(
+                timeline_pulled=False)
+    return authors, entries
@@ -0,0 +1,289 @@
+"""
+Streaming export and import of the social graph as NDJSON.
+
+An export is a header line followed by one JSON record per line: users,
+then posts, follows and likes, each in a stable key order. Archived posts
+and likes (see network.archive) are exported alongside the hot ones and
+import as hot rows; archive_posts moves them back. Derived data
+(counters, hot scores, timelines, the search index) is not exported; the
+importer rebuilds it. Memory stays flat at any size:
+
+- export walks each table with .iterator(chunk_size);
+- import bulk_creates fixed-size batches, and remaps foreign keys through
+  IdMap, which stores runs of consecutive ids rather than one entry per row.
+
+Both directions record their progress in a checkpoint file, so an
+interrupted transfer resumes where it stopped. Export writes the file in
+chunks, each a complete gzip member when compressing, and records the
+offset and byte size after each one; a resumed export truncates whatever
+the interrupted run wrote past that point. Import commits one batch at a
+time and records the offset and the id maps. Users that already exist are
+matched by username.
+"""
+import gzip
+import json
+import os
+from array import array
+from bisect import bisect_right
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from .hot import hot_score
+from .models import User, Post, Follow, Like, ArchivedPost, ArchivedLike
+
+FORMAT = {"format": "network-ndjson", "version": 1}
+
+USER_FIELDS = (
+    "id", "username", "email", "password", "first_name", "last_name",
+    "is_staff", "is_superuser", "is_active", "date_joined", "last_login",
+)
+
+# (record type, model, exported fields), in dependency order
+TABLES = [
+    ("user", User, USER_FIELDS),
+    ("post", Post, ("id", "user_id", "content", "timestamp")),
+    ("follow", Follow, ("follower_id", "following_id")),
+    ("like", Like, ("user_id", "post_id")),
+]
+
+# Tables whose cold rows live in an archive table, with the order of the combined export
+ARCHIVES = {
+    Post: (ArchivedPost, ("id",)),
+    Like: (ArchivedLike, ("user_id", "post_id")),
+}
+
+
+def exported(model, fields):
+    # `model`'s rows as values_list(*fields) in a stable order, archive included
+    if model not in ARCHIVES:
+        return model.objects.order_by("pk").values_list(*fields)
+    archive, order = ARCHIVES[model]
+    return model.objects.values_list(*fields).union(archive.objects.values_list(*fields), all=True).order_by(*order)
+
+
+@contextmanager
+def explicit_timestamps():
+    # bulk_create would otherwise stamp every post with "now"
+    field = Post._meta.get_field("timestamp")
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def export_records(write, chunk_size=2000, offset=0, header=True):
+    """
+    Write the header (if `header`) and every record after the first
+    `offset` through `write(line)`. Returns the number of records written.
+    """
+    if header:
+        write(json.dumps(FORMAT) + "\n")
+    written = 0
+    for kind, model, fields in TABLES:
+        queryset = exported(model, fields)
+        if offset:
+            total = queryset.count()
+            if offset >= total:
+                offset -= total
+                continue
+            queryset, offset = queryset[offset:], 0
+        for row in queryset.iterator(chunk_size=chunk_size):
+            record = {"model": kind}
+            for name, value in zip(fields, row):
+                record[name] = value.isoformat() if hasattr(value, "isoformat") else value
+            write(json.dumps(record, separators=(",", ":")) + "\n")
+            written += 1
+    return written
+
+
+class IdMap:
+    """Old id -> new id, stored as runs; ids must be added in increasing order."""
+
+    __slots__ = ("old", "new", "length")
+
+    def __init__(self, old=(), new=(), length=()):
+        self.old = array("q", old)
+        self.new = array("q", new)
+        self.length = array("q", length)
+
+    def add(self, old_id, new_id):
+        if self.old:
+            run = len(self.old) - 1
+            if old_id == self.old[run] + self.length[run] and new_id == self.new[run] + self.length[run]:
+                self.length[run] += 1
+                return
+        self.old.append(old_id)
+        self.new.append(new_id)
+        self.length.append(1)
+
+    def get(self, old_id):
+        run = bisect_right(self.old, old_id) - 1
+        if run >= 0 and old_id < self.old[run] + self.length[run]:
+            return self.new[run] + old_id - self.old[run]
+        return None
+
+    def to_json(self):
+        return {"old": self.old.tolist(), "new": self.new.tolist(), "length": self.length.tolist()}
+
+
+class Exporter:
+    def __init__(self, path, checkpoint_path, compress=False, chunk_size=2000, resume=False):
+        self.path = path
+        self.checkpoint_path = checkpoint_path
+        self.compress = compress
+        self.chunk_size = chunk_size
+        self.offset = 0
+        self.size = 0
+        self.lines, self.pending = [], 0
+        if resume and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                state = json.load(f)
+            self.offset = state["offset"]
+            self.size = state["size"]
+
+    def run(self):
+        """Write every record after the checkpointed offset; returns how many were written."""
+        start = self.offset
+        if self.size and (not os.path.exists(self.path) or os.path.getsize(self.path) < self.size):
+            raise ValueError(f"{self.path} is shorter than its checkpoint.")
+        with open(self.path, "r+b" if self.size else "wb") as self.file:
+            # Drop anything an interrupted run wrote after its last checkpoint
+            self.file.truncate(self.size)
+            self.file.seek(self.size)
+            if not self.size:
+                self.lines.append(json.dumps(FORMAT) + "\n")
+            export_records(self.write, self.chunk_size, self.offset, header=False)
+            self.flush()
+        return self.offset - start
+
+    def write(self, line):
+        self.lines.append(line)
+        self.pending += 1
+        if self.pending >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.lines:
+            return
+        data = "".join(self.lines).encode()
+        self.file.write(gzip.compress(data) if self.compress else data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.offset += self.pending
+        self.size = self.file.tell()
+        self.lines, self.pending = [], 0
+        self.save_checkpoint()
+
+    def save_checkpoint(self):
+        partial = f"{self.checkpoint_path}.tmp"
+        with open(partial, "w") as f:
+            json.dump({"offset": self.offset, "size": self.size}, f)
+        os.replace(partial, self.checkpoint_path)
+
+
+class Importer:
+    def __init__(self, checkpoint_path, batch_size=2000, resume=False):
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.offset = 0
+        self.maps = {"user": IdMap(), "post": IdMap()}
+        self.counts = {"user": 0, "post": 0, "follow": 0, "like": 0, "skipped": 0}
+        if resume and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                state = json.load(f)
+            self.offset = state["offset"]
+            self.counts = state["counts"]
+            self.maps = {kind: IdMap(**runs) for kind, runs in state["maps"].items()}
+
+    def run(self, lines):
+        """Import every record after the checkpointed offset; returns the counts."""
+        lines = iter(lines)
+        header = json.loads(next(lines, "null"))
+        if not isinstance(header, dict) or header.get("format") != FORMAT["format"]:
+            raise ValueError("Not a network export.")
+        if header.get("version") != FORMAT["version"]:
+            raise ValueError(f"Unsupported export version {header.get('version')}.")
+
+        batch, kind = [], None
+        for position, line in enumerate(lines):
+            if position < self.offset or not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("model") not in {kind for kind, _, _ in TABLES}:
+                raise ValueError(f"Unknown record type on line {position + 2}.")
+            if batch and (record["model"] != kind or len(batch) >= self.batch_size):
+                self.flush(kind, batch)
+                batch = []
+            kind = record["model"]
+            batch.append(record)
+        if batch:
+            self.flush(kind, batch)
+        return self.counts
+
+    def flush(self, kind, records):
+        with transaction.atomic(), explicit_timestamps():
+            getattr(self, f"import_{kind}s")(records)
+        self.offset += len(records)
+        self.save_checkpoint()
+
+    def save_checkpoint(self):
+        state = {"offset": self.offset, "counts": self.counts,
+                 "maps": {kind: idmap.to_json() for kind, idmap in self.maps.items()}}
+        partial = f"{self.checkpoint_path}.tmp"
+        with open(partial, "w") as f:
+            json.dump(state, f)
+        os.replace(partial, self.checkpoint_path)
+
+    def import_users(self, records):
+        existing = dict(
+            User.objects.filter(username__in=[r["username"] for r in records]).values_list("username", "id")
+        )
+        new = [
+            User(**{name: parse_datetime(r[name]) if name in ("date_joined", "last_login") and r[name] else r[name]
+                    for name in USER_FIELDS if name != "id"})
+            for r in records if r["username"] not in existing
+        ]
+        User.objects.bulk_create(new)
+        existing.update((user.username, user.id) for user in new)
+        for r in records:
+            self.maps["user"].add(r["id"], existing[r["username"]])
+        self.counts["user"] += len(new)
+
+    def import_posts(self, records):
+        kept, posts = [], []
+        for r in records:
+            user_id = self.maps["user"].get(r["user_id"])
+            if user_id is None:
+                self.counts["skipped"] += 1
+                continue
+            timestamp = parse_datetime(r["timestamp"])
+            kept.append(r["id"])
+            posts.append(Post(user_id=user_id, content=r["content"], timestamp=timestamp,
+                              hot_score=hot_score(0, timestamp)))
+        Post.objects.bulk_create(posts)
+        for old_id, post in zip(kept, posts):
+            self.maps["post"].add(old_id, post.id)
+        self.counts["post"] += len(posts)
+
+    def import_follows(self, records):
+        follows = self.remapped(records, Follow, follower_id="user", following_id="user")
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        self.counts["follow"] += len(follows)
+
+    def import_likes(self, records):
+        likes = self.remapped(records, Like, user_id="user", post_id="post")
+        Like.objects.bulk_create(likes, ignore_conflicts=True)
+        self.counts["like"] += len(likes)
+
+    def remapped(self, records, model, **fields):
+        objs = []
+        for r in records:
+            values = {name: self.maps[kind].get(r[name]) for name, kind in fields.items()}
+            if None in values.values():
+                self.counts["skipped"] += 1
+            else:
+                objs.append(model(**values))
+        return objs
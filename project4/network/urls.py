@@ -10,8 +10,15 @@ urlpatterns = [
     path("register", views.register, name="register"),
     path('posts', views.posts, name='posts'),
     path('profile/<str:username>', views.profile, name='profile'),
+    path('users/<str:username>', views.user_page, name='user_page'),
     path('follow/<str:username>', views.follow_user, name='follow_user'),
     path('like/<int:post_id>', views.like_post, name='like_post'),
     path('edit_post/<int:post_id>/', views.edit_post, name='edit_post'),
     path('following', views.following_posts, name='following_posts'),
+    path('batch', views.batch, name='batch'),
+    path('search', views.search, name='search'),
+    path('suggestions', views.suggestions, name='suggestions'),
+    path('stream', views.live_stream, name='stream'),
+    path('debug/cache', views.cache_stats, name='cache_stats'),
+    path('debug/perf', views.perf_stats, name='perf_stats'),
 ]
@@ -1,16 +1,61 @@
 from django.contrib.auth import authenticate, login, logout
-from django.db import IntegrityError
-from django.http import JsonResponse, HttpResponse, HttpResponseRedirect, HttpResponseBadRequest
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseRedirect, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from .models import User, Post, Follow, Like
+from .models import User, Post, Follow, Like, ArchivedPost
+from .pagination import paginate
+from .hydration import feed_queryset, hydrate_posts, overlay_viewer, post_values, requested_fields, serialize_values
+from . import archive, feedcache, graphcache, likebuffer, perf
+from .responses import JsonResponse
+from .stream import broker, event_stream
+from .conditional import feed_condition
+from .timeline import timeline_page
+from .routers import read_replica
+from .search import search_page
+from .suggestions import suggestions_for, top_count
+from .batch import max_operations, run_batch, scopes
+from .ratelimit import charge, enabled, rate_limit, too_many
 import json
 
+# /posts?sort= values and the Post field each one orders by
+FEED_ORDERS = {"new": "timestamp", "hot": "hot_score"}
+
+def render_app(request, preload=None, next_url=None):
+    # The app shell, with the first page embedded for app.js and the next one prefetched
+    return render(request, "network/index.html", {"preload": preload, "prefetch": next_url})
+
+@read_replica
 def index(request):
-    return render(request, "network/index.html")
+    # Signed-in visits get the first feed page inline instead of fetching it (see app.js)
+    if not request.user.is_authenticated:
+        return render_app(request)
+    sort, cursor = request.GET.get("sort", "new"), request.GET.get("cursor", "")
+    try:
+        data = feed_page(request)
+    except ValueError:
+        # Let app.js fetch the page and show the error
+        return render_app(request)
+    next_url = f"{reverse('posts')}?sort={sort}&cursor={data['next']}" if data.get("next") else None
+    return render_app(request, {"view": "posts", "sort": sort, "cursor": cursor, "data": data}, next_url)
+
+@read_replica
+def user_page(request, username):
+    # Deep link to a profile: the app shell with that profile's first page inline
+    if not request.user.is_authenticated:
+        return HttpResponseRedirect(reverse("login"))
+    user = get_object_or_404(User, pk=graphcache.user_id(username))
+    cursor = request.GET.get("cursor", "")
+    try:
+        data = profile_page(request, user)
+    except ValueError:
+        return render_app(request)
+    next_url = f"{reverse('profile', args=[user.username])}?cursor={data['next']}" if data.get("next") else None
+    return render_app(request, {"view": "profile", "username": user.username, "cursor": cursor, "data": data}, next_url)
 
 def login_view(request):
     if request.method == "POST":
@@ -63,6 +108,10 @@ def register(request):
     
 @login_required
 @csrf_exempt
+@rate_limit("post")
+@cache_control(private=True, no_cache=True)
+@read_replica
+@feed_condition(lambda request: ["feed"])
 def posts(request):
     if request.method == "POST":
         # Create a new post
@@ -72,34 +121,39 @@ def posts(request):
         post.save()
         return JsonResponse({"id": post.id, "content": post.content, "timestamp": post.timestamp, "user": post.user.username}, status=201)
     elif request.method == "GET":
-        all_posts = Post.objects.all().order_by("-timestamp")
-
-        # Implement pagination
-        page_number = request.GET.get('page', 1)  # Default to page 1 if not provided
-        paginator = Paginator(all_posts, 10)  # Show 10 posts per page
-
-        page_obj = paginator.get_page(page_number)
-        posts_list = [{
-            'id': post.id,
-            'user': post.user.username,
-            'content': post.content,
-            'timestamp': post.timestamp,
-            'like_count': post.likes.count(),
-            'is_liked': request.user in post.likes.all(),
-            'is_owner': post.user == request.user  # Ownership field
-        } for post in page_obj]
-
-        return JsonResponse({
-            'posts': posts_list,
-            'current_user': request.user.username,
-            'has_next': page_obj.has_next(),
-            'has_previous': page_obj.has_previous(),
-            'total_pages': paginator.num_pages,
-            'current_page': page_obj.number
-        })
+        try:
+            return JsonResponse(feed_page(request))
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+def feed_page(request):
+    """The GET /posts body for `request`, also embedded by index. Raises ValueError for bad parameters."""
+    # Newest first, or ?sort=hot for trending (see network.hot)
+    order_field = FEED_ORDERS.get(request.GET.get("sort", "new"))
+    if order_field is None:
+        raise ValueError("Unknown sort order.")
+
+    def build():
+        # Rows are fetched as tuples, not model instances
+        all_posts = post_values(Post.objects.all(), order_field)
+        # Past the hot table the newest-first feed continues into the archive (see network.archive)
+        archived = (post_values(ArchivedPost.objects.all()), "id") if order_field == "timestamp" else None
+        # Keyset pagination, or the legacy ?page= mode
+        page, page_meta = paginate(request, all_posts, 10, order_field=order_field, fallback=archived)  # Show 10 posts per page
+        return {'posts': serialize_values(page), **page_meta}
+
+    # The shared page comes from the cache; viewer flags (and ?fields=) are applied on top
+    fields = requested_fields(request)
+    payload = feedcache.cached_page("feed", request, build)
+    return {
+        **payload,
+        'posts': overlay_viewer(payload['posts'], request.user, fields),
+        'current_user': request.user.username
+    }
 
 @login_required
 @csrf_exempt
+@rate_limit("edit")
 def edit_post(request, post_id):
     if request.method == 'POST':
         # Get the post to edit
@@ -117,63 +171,95 @@ def edit_post(request, post_id):
         return JsonResponse({"message": "Post updated successfully."}, status=200)
     return JsonResponse({"error": "POST request required."}, status=400)
     
+def profile_scopes(request, username):
+    user_id = graphcache.user_id(username)
+    return None if user_id is None else [f"profile:{user_id}"]
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@read_replica
+@feed_condition(profile_scopes)
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    user_posts = user.posts.all().order_by("-timestamp")
-    is_following = Follow.objects.filter(follower=request.user, following=user).exists()
+    user = get_object_or_404(User, pk=graphcache.user_id(username))
+    try:
+        return JsonResponse(profile_page(request, user))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
-    # Implement pagination
-    page_number = request.GET.get('page', 1)  # Default to page 1 if not provided
-    paginator = Paginator(user_posts, 10)  # Show 10 posts per page
-    page_obj = paginator.get_page(page_number)
+def profile_page(request, user):
+    """The GET /profile/<username> body for `user`, also embedded by user_page. Raises ValueError for bad parameters."""
+    is_following = graphcache.is_following(request.user.id, user.id)
 
-    return JsonResponse({
-        "user": {
-            "username": user.username,
-            "email": user.email
-        },
-        "posts": [{
-            "id": post.id,
-            "content": post.content,
-            "timestamp": post.timestamp,
-            "like_count": post.likes.count(),
-            'user': post.user.username,
-            'is_owner': post.user == request.user,  # Already checking ownership
-        } for post in page_obj],
+    def build():
+        user_posts = post_values(user.posts.all())
+        archived = post_values(user.archived_posts.all())
+        # Keyset pagination, or the legacy ?page= mode; older posts come from the archive
+        page, page_meta = paginate(request, user_posts, 10, fallback=(archived, "id"))  # Show 10 posts per page
+        return {"posts": serialize_values(page), **page_meta}
+
+    # The shared page comes from the cache; viewer flags (and ?fields=) are applied on top
+    fields = requested_fields(request, extra=("email",))
+    payload = feedcache.cached_page(f"profile:{user.id}", request, build)
+
+    profile_user = {"username": user.username}
+    if fields is None or "email" in fields:
+        profile_user["email"] = user.email
+
+    return {
+        **payload,
+        "user": profile_user,
+        "posts": overlay_viewer(payload["posts"], request.user, fields),
         "is_following": is_following,
-        "followers_count": user.followers.count(),
-        "following_count": user.following.count(),
-        "current_user": request.user.username,  # Add the logged-in user's username here
-        "has_next": page_obj.has_next(),
-        "has_previous": page_obj.has_previous(),
-        "total_pages": paginator.num_pages,
-        "current_page": page_obj.number
-    })
+        "followers_count": user.followers_count,
+        "following_count": user.following_count,
+        "current_user": request.user.username  # Add the logged-in user's username here
+    }
 
 @login_required
 @csrf_exempt
+@rate_limit("like")
 def like_post(request, post_id):
     if request.method == "POST":
         try:
-            post = get_object_or_404(Post, id=post_id)
+            post = Post.objects.filter(id=post_id).first()
             user = request.user
 
             # Parse the JSON body
             data = json.loads(request.body)
             liked = data.get('liked', False)  # Get 'liked' status from the request
 
-            if liked:
-                # Like the post
-                Like.objects.get_or_create(user=user, post=post)
-            else:
-                # Unlike the post
-                Like.objects.filter(user=user, post=post).delete()
+            if post is None:
+                # Old posts live in the archive (see network.archive)
+                archived = ArchivedPost.objects.filter(id=post_id).first()
+                if archived is None:
+                    return JsonResponse({"error": "Post not found."}, status=404)
+                return JsonResponse({
+                    "message": "Like status updated successfully.",
+                    "like_count": archive.toggle_like(user, archived, bool(liked))
+                }, status=200)
+
+            if likebuffer.enabled():
+                # Coalesced with other toggles and written in the next flush
+                pending = likebuffer.get_buffer().toggle(user.id, post.id, bool(liked))
+                return JsonResponse({
+                    "message": "Like status updated successfully.",
+                    "like_count": post.likes_count + pending
+                }, status=200)
+
+            # The like row and the post's like counter change together
+            with transaction.atomic():
+                if liked:
+                    # Like the post
+                    Like.objects.get_or_create(user=user, post=post)
+                else:
+                    # Unlike the post
+                    Like.objects.filter(user=user, post=post).delete()
+            post.refresh_from_db(fields=["likes_count"])
 
             # Return the updated like count and a success message
             return JsonResponse({
                 "message": "Like status updated successfully.",
-                "like_count": post.likes.count()
+                "like_count": post.likes_count
             }, status=200)
         
         except json.JSONDecodeError:
@@ -185,52 +271,138 @@ def like_post(request, post_id):
 
 @login_required
 @csrf_exempt
+@rate_limit("follow")
 def follow_user(request, username):
-    user_to_follow = get_object_or_404(User, username=username)
+    user_id = graphcache.user_id(username)
+    if user_id is None:
+        return JsonResponse({"error": "User not found."}, status=404)
     follower = request.user
 
     # Prevent user from following themselves
-    if follower == user_to_follow:
+    if follower.id == user_id:
         return JsonResponse({"error": "You cannot follow yourself."}, status=400)
 
-    # Handle follow/unfollow logic
-    if Follow.objects.filter(follower=follower, following=user_to_follow).exists():
-        # Unfollow if already following
-        Follow.objects.filter(follower=follower, following=user_to_follow).delete()
-        return JsonResponse({"message": "Unfollowed successfully."}, status=200)
-    else:
-        # Follow if not already following
-        Follow.objects.create(follower=follower, following=user_to_follow)
-        return JsonResponse({"message": "Followed successfully."}, status=201)
+    # Handle follow/unfollow logic; the cached following set decides the toggle
+    if not graphcache.is_following(follower.id, user_id):
+        try:
+            # Follow if not already following
+            with transaction.atomic():
+                Follow.objects.create(follower=follower, following_id=user_id)
+            return JsonResponse({"message": "Followed successfully."}, status=201)
+        except IntegrityError:
+            pass  # the cache was stale: already following, so this click unfollows
+
+    # Unfollow if already following
+    with transaction.atomic():
+        Follow.objects.filter(follower=follower, following_id=user_id).delete()
+    return JsonResponse({"message": "Unfollowed successfully."}, status=200)
 
 @login_required
+@csrf_exempt
+@rate_limit("batch")
+def batch(request):
+    # Several like/follow/edit/profile operations in one round trip (see network.batch)
+    if request.method != "POST":
+        return JsonResponse({"error": "POST request required."}, status=400)
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON data."}, status=400)
+
+    operations = data.get("operations") if isinstance(data, dict) else data
+    if not isinstance(operations, list):
+        return JsonResponse({"error": "Expected a list of operations."}, status=400)
+    if len(operations) > max_operations():
+        return JsonResponse({"error": f"At most {max_operations()} operations per batch."}, status=400)
+    if enabled():
+        # One token per operation from its own scope, as if each had been sent alone
+        wait = charge(request, scopes(operations))
+        if wait:
+            return too_many("Too many requests.", 429, wait)
+
+    return JsonResponse({"results": run_batch(request.user, operations)})
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@read_replica
+@feed_condition(lambda request: ["feed", f"profile:{request.user.id}"])
 def following_posts(request):
-    # Get the list of users that the current user is following via the Follow model
+    # Read the current user's materialized timeline (see network.timeline)
     current_user = request.user
-    following_users = Follow.objects.filter(follower=current_user).values_list('following', flat=True)
-
-    # Get the posts from those users
-    following_posts = Post.objects.filter(user__in=following_users).order_by('-timestamp')
-
-    # Implement pagination
-    page_number = request.GET.get('page', 1)  # Default to page 1 if not provided
-    paginator = Paginator(following_posts, 2)  # Show 10 posts per page
-
-    page_obj = paginator.get_page(page_number)
-    post_list = [{
-        'id': post.id,
-        'user': post.user.username,
-        'content': post.content,
-        'timestamp': post.timestamp,
-        'like_count': post.likes.count(),
-        'is_liked': post.likes.filter(id=current_user.id).exists(),
-        'is_owner': post.user == current_user
-    } for post in page_obj]
+
+    # Keyset pagination, or the legacy ?page= mode
+    try:
+        fields = requested_fields(request)
+        page, page_meta = timeline_page(request, current_user, 2)  # Show 2 posts per page
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    post_list = overlay_viewer(serialize_values(page), current_user, fields)
 
     return JsonResponse({
         'posts': post_list,
-        'has_next': page_obj.has_next(),
-        'has_previous': page_obj.has_previous(),
-        'total_pages': paginator.num_pages,
-        'current_page': page_obj.number
-    })
\ No newline at end of file
+        **page_meta
+    })
+
+@login_required
+@read_replica
+def search(request):
+    # Full-text search over post content, best match first (see network.search)
+    query = request.GET.get("q", "")
+    author_id = None
+    if request.GET.get("author"):
+        author_id = graphcache.user_id(request.GET["author"])
+        if author_id is None:
+            return JsonResponse({"error": "User not found."}, status=404)
+
+    try:
+        fields = requested_fields(request)
+        page, page_meta = search_page(request, feed_queryset(Post.objects.all()), query, 10, author_id)  # Show 10 posts per page
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse({
+        "posts": hydrate_posts(page, request.user, fields),
+        **page_meta,
+        "query": query,
+    })
+
+@login_required
+@read_replica
+def suggestions(request):
+    # Accounts to follow, precomputed from the follow graph (see network.suggestions)
+    try:
+        count = min(int(request.GET.get("count", 10)), top_count())
+    except ValueError:
+        count = 0
+    if count < 1:
+        return JsonResponse({"error": "Invalid count."}, status=400)
+    following_ids = graphcache.following_ids(request.user.id)
+    return JsonResponse({"suggestions": suggestions_for(request.user, following_ids, count)})
+
+@login_required
+async def live_stream(request):
+    # Server-Sent Events: new posts, edits and like counts as they happen
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI the endless stream would hold a worker forever; 204 stops EventSource retrying
+        return HttpResponse(status=204)
+    queue = broker.subscribe()
+    if queue is None:
+        return JsonResponse({"error": "Too many live connections."}, status=503)
+    response = StreamingHttpResponse(event_stream(queue), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+@login_required
+def cache_stats(request):
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Staff only."}, status=403)
+    return JsonResponse({**feedcache.stats(), "graph": graphcache.stats()})
+
+
+@login_required
+def perf_stats(request):
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Staff only."}, status=403)
+    return JsonResponse({"sample_rate": perf.sample_rate(), "views": perf.registry.snapshot()})
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
 import os
+from pathlib import Path
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -42,10 +43,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'network.perf.PerfMiddleware',
+    'network.responses.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'network.auth.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -81,8 +84,116 @@ DATABASES = {
     }
 }
 
+# Opt-in production profile for SQLite: NETWORK_PROFILE=production enables WAL
+# and connection reuse, and serves feed/profile reads from a read-only
+# connection (see network.sqlite and network.routers)
+NETWORK_PROFILE = os.environ.get('NETWORK_PROFILE', 'development')
+
+if NETWORK_PROFILE == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        # Take the write lock when a transaction starts, so concurrent writers
+        # queue on the busy timeout instead of failing to upgrade a read lock
+        'OPTIONS': {'timeout': 20, 'transaction_mode': 'IMMEDIATE'},
+    })
+    DATABASES['readonly'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': Path(DATABASES['default']['NAME']).as_uri() + '?mode=ro',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'timeout': 20},
+        'TEST': {'MIRROR': 'default'},
+    }
+    NETWORK_READ_DATABASE = 'readonly'
+    NETWORK_SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # negative: KiB, so 64 MiB per connection
+        'temp_store': 'MEMORY',
+    }
+
+DATABASE_ROUTERS = ['network.routers.ReadReplicaRouter']
+
 AUTH_USER_MODEL = "network.User"
 
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'network',
+    }
+}
+
+# Sessions are read from the cache and written through to the database;
+# request.user is cached beside them for this many seconds (see network.auth).
+# LocMemCache is per process: logout and password changes only reach the
+# worker that handled them, so with several workers use a shared cache here
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'default'
+NETWORK_USER_CACHE_TIMEOUT = 300
+
+# Feed and profile pages are cached for this many seconds (see network.feedcache)
+NETWORK_CACHE_TIMEOUT = 300
+
+# Buffer like toggles in process and write them in batches (see network.likebuffer)
+NETWORK_LIKE_BUFFER = False
+NETWORK_LIKE_BUFFER_SIZE = 500
+NETWORK_LIKE_BUFFER_INTERVAL = 1.0
+
+# Live /stream connections (see network.stream). Needs an ASGI server; under
+# WSGI /stream answers 204 and app.js polls the feed instead
+NETWORK_STREAM_MAX_CONNECTIONS = 100
+NETWORK_STREAM_QUEUE_SIZE = 100
+
+# In-process username and following-set cache: entries per map, seconds each
+# entry lives (see network.graphcache)
+NETWORK_GRAPH_CACHE_SIZE = 10000
+NETWORK_GRAPH_CACHE_TTL = 60
+
+# Most operations accepted by one /batch request (see network.batch)
+NETWORK_BATCH_MAX_OPERATIONS = 100
+
+# Token buckets for the write endpoints, per user and per client IP: "N/period"
+# allows a burst of N refilled over the period (see network.ratelimit)
+NETWORK_RATE_LIMIT_ENABLED = True
+NETWORK_RATE_LIMIT_BACKEND = 'network.ratelimit.MemoryBackend'
+NETWORK_RATE_LIMIT_SHARDS = 16
+NETWORK_RATE_LIMIT_MAX_KEYS = 100000
+NETWORK_RATE_LIMITS = {
+    'post': {'user': '10/m', 'ip': '60/m'},
+    'edit': {'user': '30/m', 'ip': '120/m'},
+    'like': {'user': '120/m', 'ip': '600/m'},
+    'follow': {'user': '30/m', 'ip': '120/m'},
+    'batch': {'user': '30/m', 'ip': '120/m'},
+}
+# Writes get 503 while the average write statement takes longer than this
+NETWORK_LOAD_SHED_WRITE_MS = 250
+
+# "Who to follow": suggestions stored per user, weight of log10(followers) next
+# to mutual follows, and per-chunk limits of the ranking job (see network.suggestions)
+NETWORK_SUGGESTION_COUNT = 20
+NETWORK_SUGGESTION_POPULARITY_WEIGHT = 0.5
+NETWORK_SUGGESTION_CHUNK_USERS = 1000
+NETWORK_SUGGESTION_CHUNK_PATHS = 2000000
+
+# Posts older than this move, with their likes, to the archive tables on
+# `manage.py archive_posts` (see network.archive)
+NETWORK_ARCHIVE_AFTER_DAYS = 365
+
+# JSON bodies at least this large are gzipped or deflated when the client
+# accepts it (see network.responses)
+NETWORK_COMPRESS_MIN_BYTES = 1024
+NETWORK_COMPRESS_LEVEL = 6
+
+# Share of requests timed by network.perf.PerfMiddleware, and how many runs
+# of one SQL statement in a request count as an N+1 pattern
+NETWORK_PERF_SAMPLE_RATE = 1.0 if DEBUG else 0.05
+NETWORK_PERF_NPLUSONE_THRESHOLD = 5
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 